@@ -0,0 +1,575 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from ats import format_for_prompt, role_family, score_profile
+from backends import get_backend
+from hedging import hedge_delay, hedge_fallback
+from inference import Cancelled, CancelToken, DeadlineExceeded, InferenceError
+from metrics import METRICS, new_span
+from output_schema import ANALYSIS_SCHEMA, REVIEW_SCHEMA, SchemaError, parse_output, schema_instructions, \
+    schema_max_tokens, to_markdown
+from prompt_budget import AGENT_INPUT_BUDGETS, allocate, count_tokens
+from scheduler import run_agent_graph
+from similarity import role_key
+from storage import get_store
+
+# Overall time budget for one four-agent run, including rate-limit waits and retries
+RUN_DEADLINE_SECONDS = 300
+# Error of a run stopped through its cancel token
+STOPPED_MESSAGE = "⏹️ Run stopped."
+
+# Threads for hedged requests; the agent's own thread waits on the race
+HEDGE_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+class LinkedInAgent:
+    """Base agent class"""
+    # Result keys of upstream agents this agent reads from its context
+    requires = ()
+    # Profile fields this agent's prompt is built from
+    profile_fields = ()
+    # Bump when the prompt changes so stored results are not reused
+    prompt_version = 1
+    # Token budget for the variable text embedded in this agent's prompt
+    input_budget = 400
+    # Declared JSON output (see output_schema.py); None for free-text agents
+    output_schema = None
+    
+    def __init__(self, name, role, api_token, model, logs=None, use_cache=True, on_token=None,
+                 hedge=False, label=None):
+        self.name = name
+        self.role = role
+        # Free-form tag for logs and spans (e.g. a fan-out target role); never part of the name,
+        # which is a metrics label
+        self.label = label
+        self.api_token = api_token
+        self.model = model
+        self.use_cache = use_cache
+        self.on_token = on_token
+        # Race a backup model against a primary that is slower than usual
+        self.hedge = hedge
+        self.logs = logs if logs is not None else []
+        # time.monotonic() value after which no new request or retry is started
+        self.deadline = None
+        # Run-wide CancelToken; once set, no new request, retry or agent is started
+        self.cancel = None
+        self.elapsed = None
+        # Pipeline run this agent's spans are attributed to
+        self.run_id = None
+        # Reuse the stored result when this agent's inputs are unchanged
+        self.incremental = False
+        self.reused = False
+        # Result key to checkpoint under run_id once execute() returns
+        self.checkpoint_key = None
+    
+    def log_activity(self, message):
+        self.logs.append({
+            "agent": f"{self.name} [{self.label}]" if self.label else self.name,
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "message": message
+        })
+    
+    def run(self, profile_data, context=None):
+        """execute() with its wall-clock duration recorded in self.elapsed.
+
+        With `incremental` set, a result stored for identical inputs (see
+        fingerprint) is returned without calling the model, and new results
+        are stored for the next run. With `checkpoint_key` set, the result
+        is checkpointed under run_id, even if another agent of the run has
+        already failed. A cancelled run, or one past its deadline, does not
+        start the agent at all.
+        """
+        if self.cancel is not None and self.cancel.is_set():
+            raise Cancelled(STOPPED_MESSAGE)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded("⏱️ Run deadline exceeded before this agent could start.")
+        started = time.monotonic()
+        try:
+            fingerprint = self.fingerprint(profile_data, context) if self.incremental else None
+            result = get_store().get_agent_result(fingerprint) if fingerprint else None
+            if result is not None:
+                self.reused = True
+                self.log_activity("♻️ Inputs unchanged since the last run, reusing its result")
+                if self.on_token:
+                    self.on_token(result)
+            else:
+                result = self.execute(profile_data, context)
+                if fingerprint:
+                    get_store().save_agent_result(fingerprint, self.name, self.model, result)
+            if self.checkpoint_key:
+                get_store().save_checkpoint(self.run_id, self.checkpoint_key, result)
+            return result
+        finally:
+            self.elapsed = time.monotonic() - started
+    
+    def fingerprint(self, profile_data, context=None):
+        """Content hash of everything this agent's prompt is built from.
+
+        Covers the agent and prompt version, the model, the profile fields
+        the agent reads and the upstream results in its context, so an
+        agent is only re-run when one of those actually changed.
+        """
+        payload = json.dumps({
+            'agent': type(self).__name__,
+            'version': self.prompt_version,
+            'model': self.model,
+            'fields': {field: profile_data.get(field) or '' for field in self.profile_fields},
+            'context': context or {},
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def fit(self, fields):
+        """Compact and truncate (name, text, weight) fields to the agent's input budget"""
+        fitted = allocate(fields, self.input_budget, self.model)
+        return {name: text or 'Not provided' for name, text in fitted.items()}
+    
+    def profile_block(self, profile_data):
+        """Headline and about, formatted identically for every agent that embeds them.
+
+        Agents start their prompt with this block and pass it to generate()
+        as the shared prefix, so its KV cache can be computed once per profile.
+        The target role follows the block rather than being part of it, so
+        the prefix is also shared across the roles of a fan-out run.
+        """
+        fields = allocate([
+            ('headline', profile_data.get('headline', ''), 1),
+            ('about', profile_data.get('about', ''), 3),
+        ], AGENT_INPUT_BUDGETS['profile'], self.model)
+        return f"""PROFILE
+HEADLINE: {fields['headline'] or 'Not provided'}
+ABOUT: {fields['about'] or 'Not provided'}
+
+"""
+    
+    def generate(self, prompt, max_length=500, prefix=None):
+        """Return the completion text; raises InferenceError on failure.
+
+        The request goes to the backend serving the model (backends.get_backend).
+        `prefix` marks the start of `prompt` other agents send too, so backends
+        that can may reuse its KV cache. Each request is recorded as a span in
+        METRICS. With hedging enabled the request may be raced against a
+        backup model (see _generate_hedged).
+        """
+        fallback = hedge_fallback(self.model) if self.hedge else None
+        if fallback is None:
+            return self._request(self.model, prompt, max_length, self.on_token, self.cancel, prefix=prefix)
+        return self._generate_hedged(prompt, max_length, fallback, prefix)
+    
+    def generate_structured(self, prompt, prefix=None):
+        """generate() asking for JSON matching self.output_schema.
+
+        The generation budget comes from the schema rather than a fixed
+        max_length. Returns the validated object as compact JSON text, or
+        the raw response (logged) when the model did not follow the schema.
+        """
+        response = self.generate(f"{prompt}\n\n{schema_instructions(self.output_schema)}",
+                                 max_length=schema_max_tokens(self.output_schema, self.model), prefix=prefix)
+        try:
+            return json.dumps(parse_output(response, self.output_schema), ensure_ascii=False)
+        except SchemaError as e:
+            self.log_activity(f"⚠️ Output did not match the schema ({e}), keeping it as text")
+            return response
+    
+    def _request(self, model, prompt, max_length, on_token, cancel=None, hedge=None, prefix=None):
+        span = new_span(self.run_id, self.name, model, role=self.label)
+        span['hedge'] = hedge
+        started = time.monotonic()
+        try:
+            response = get_backend(model, self.api_token).generate(
+                model, prompt, max_length, prefix=prefix, use_cache=self.use_cache, on_token=on_token,
+                deadline=self.deadline, span=span, cancel=cancel)
+            span['completion_tokens'] = count_tokens(response, model)
+            return response
+        except InferenceError as e:
+            span['outcome'] = type(e).__name__
+            raise
+        finally:
+            span['prompt_tokens'] = count_tokens(prompt, model)
+            span['duration'] = time.monotonic() - started
+            METRICS.record_span(span)
+    
+    def _generate_hedged(self, prompt, max_length, fallback, prefix=None):
+        """Send to self.model, and to `fallback` too if the primary is slow or fails.
+
+        The backup fires once the primary has taken longer than its usual
+        latency (hedging.hedge_delay), or immediately if the primary fails
+        first. The first good answer wins and the other request is
+        cancelled. When streaming, the first request to produce a token owns
+        the stream and the other is cancelled right away.
+        """
+        lock = threading.Lock()
+        owner = []
+        cancels = {}
+        
+        def start(model, hedge):
+            # Stopping the run stops both requests; stopping one request leaves the run alone
+            cancel = self.cancel.child() if self.cancel is not None else CancelToken()
+            on_token = None
+            if self.on_token:
+                def on_token(delta):
+                    with lock:
+                        if not owner:
+                            owner.append(model)
+                            for other, event in cancels.items():
+                                if other != model:
+                                    event.set()
+                    if owner[0] == model:
+                        self.on_token(delta)
+            with lock:
+                cancels[model] = cancel
+            future = HEDGE_POOL.submit(self._request, model, prompt, max_length, on_token, cancel, hedge, prefix)
+            futures[future] = model
+            return future
+        
+        futures = {}
+        primary = start(self.model, 'primary')
+        delay = hedge_delay(self.model, streaming=bool(self.on_token))
+        wait([primary], timeout=delay)
+        with lock:
+            backup_needed = not owner
+        if backup_needed and (not primary.done() or primary.exception() is not None):
+            self.log_activity(f"⚡ No answer from {self.model} after {delay:.1f}s, hedging with {fallback}")
+            start(fallback, 'backup')
+        
+        pending, errors = set(futures), {}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                model = futures[future]
+                error = future.exception()
+                if error is None:
+                    for other, event in cancels.items():
+                        if other != model:
+                            event.set()
+                    if model != self.model:
+                        self.log_activity(f"🏁 Backup {model} answered first")
+                    return future.result()
+                errors[model] = error
+        # Report the primary's failure unless it was only cancelled in favour of the backup
+        error = errors[self.model]
+        if isinstance(error, Cancelled) and fallback in errors:
+            error = errors[fallback]
+        raise error
+
+def ats_checks(profile_data, roles):
+    """{role: score_profile() result}, scoring each keyword family once"""
+    by_family = {}
+    for role in roles:
+        by_family.setdefault(role_family(role), role)
+    scored = {family: score_profile({**profile_data, 'target_role': role}) for family, role in by_family.items()}
+    return {role: scored[role_family(role)] for role in roles}
+
+class Agent1_Analyzer(LinkedInAgent):
+    profile_fields = ('target_role', 'headline', 'about', 'experience', 'skills')
+    input_budget = AGENT_INPUT_BUDGETS['agent1']
+    prompt_version = 4
+    output_schema = ANALYSIS_SCHEMA
+    
+    def execute(self, profile_data, context=None):
+        self.log_activity("🔍 Starting comprehensive analysis...")
+        # A fan-out run analyzes the profile once for all of its target roles
+        roles = profile_data.get('target_roles') or [profile_data.get('target_role') or 'Remote position']
+        # Keyword coverage is computed locally, so the model only has to prioritize it
+        checks = ats_checks(profile_data, roles)
+        for role, ats in checks.items():
+            self.log_activity(f"⚡ Local ATS pre-score{f' for {role}' if len(roles) > 1 else ''}: {ats['score']}/100")
+        block = self.profile_block(profile_data)
+        fields = self.fit([
+            ('experience', profile_data.get('experience', ''), 3),
+            ('skills', profile_data.get('skills', ''), 1),
+        ])
+        if len(roles) == 1:
+            target = f"TARGET ROLE: {roles[0]}"
+            ats_lines = f"ATS KEYWORD CHECK (precomputed): {format_for_prompt(checks[roles[0]])}"
+        else:
+            target = (f"TARGET ROLES: {'; '.join(roles)}\n"
+                      "(One analysis serves all of these roles: cover what they share and name role-specific gaps.)")
+            ats_lines = "\n".join(f"ATS KEYWORD CHECK for {role} (precomputed): {format_for_prompt(ats)}"
+                                  for role, ats in checks.items())
+        prompt = block + f"""{target}
+
+You are a LinkedIn Profile Analyzer for remote jobs. Analyze the profile above, which continues with:
+
+EXPERIENCE: {fields['experience']}
+SKILLS: {fields['skills']}
+{ats_lines}"""
+        
+        response = self.generate_structured(prompt, prefix=block)
+        self.log_activity("✅ Analysis complete")
+        return response
+
+class Agent2_ReAnalyzer(LinkedInAgent):
+    requires = ('agent1',)
+    profile_fields = ('target_role',)
+    input_budget = AGENT_INPUT_BUDGETS['agent2']
+    
+    def execute(self, profile_data, context=None):
+        self.log_activity("🔄 Re-analyzing and validating...")
+        analysis = to_markdown(context.get('agent1_result', ''), ANALYSIS_SCHEMA)
+        agent1_result = self.fit([('analysis', analysis, 1)])['analysis']
+        prompt = f"""You are a Critical Reviewer. Review this LinkedIn analysis:
+
+ANALYSIS:
+{agent1_result}
+
+PROFILE TARGET: {profile_data.get('target_role')}
+
+Provide:
+1. Do you agree with the assessment? Why or why not?
+2. 2 Overlooked opportunities
+3. 2 Alternative improvement approaches
+4. Market insight for this role"""
+        
+        response = self.generate(prompt, max_length=500)
+        self.log_activity("✅ Re-analysis complete")
+        return response
+
+class Agent3_Rewriter(LinkedInAgent):
+    profile_fields = ('target_role', 'headline', 'about')
+    input_budget = AGENT_INPUT_BUDGETS['profile']
+    prompt_version = 3
+    
+    def execute(self, profile_data, context=None):
+        self.log_activity("✍️ Rewriting profile for remote roles...")
+        block = self.profile_block(profile_data)
+        prompt = block + f"""TARGET ROLE: {profile_data.get('target_role') or 'Remote position'}
+
+You are a LinkedIn Profile Writer. Create an optimized profile for the target role above, starting from the current headline and about section.
+
+Create:
+1. NEW HEADLINE (120 chars max, keyword-rich, remote-focused)
+2. NEW ABOUT SECTION (2-3 short paragraphs, highlight remote skills)
+3. 5 OPTIMIZED EXPERIENCE BULLETS (start with action verbs)
+4. TOP 15 SKILLS (ATS-optimized, include relevant technologies)"""
+        
+        response = self.generate(prompt, max_length=800, prefix=block)
+        self.log_activity("✅ Profile rewrite complete")
+        return response
+
+class Agent4_Reviewer(LinkedInAgent):
+    requires = ('agent3',)
+    profile_fields = ('target_role',)
+    input_budget = AGENT_INPUT_BUDGETS['agent4']
+    prompt_version = 2
+    output_schema = REVIEW_SCHEMA
+    
+    def execute(self, profile_data, context=None):
+        self.log_activity("🔎 Final quality review...")
+        rewritten = self.fit([('profile', context.get('agent3_result', ''), 1)])['profile']
+        prompt = f"""You are a Quality Reviewer. Review this optimized LinkedIn profile:
+
+{rewritten}
+
+TARGET: {profile_data.get('target_role')}"""
+        
+        response = self.generate_structured(prompt)
+        self.log_activity("✅ Review complete")
+        return response
+
+AGENT_LABELS = {
+    'agent1': "Agent 1: Analysis",
+    'agent2': "Agent 2: Re-analysis",
+    'agent3': "Agent 3: Profile rewrite",
+    'agent4': "Agent 4: Final review",
+}
+
+def build_agents(api_token, model, logs=None, use_cache=True, hedge=False, label=None):
+    """Create the four agents keyed by result name; `label` tags their logs and spans (e.g. a target role)"""
+    return {
+        'agent1': Agent1_Analyzer("Agent 1: Analyzer", "Initial Analysis", api_token, model, logs, use_cache,
+                                  hedge=hedge, label=label),
+        'agent2': Agent2_ReAnalyzer("Agent 2: Re-Analyzer", "Critical Review", api_token, model, logs, use_cache,
+                                    hedge=hedge, label=label),
+        'agent3': Agent3_Rewriter("Agent 3: Rewriter", "Profile Optimization", api_token, model, logs, use_cache,
+                                  hedge=hedge, label=label),
+        'agent4': Agent4_Reviewer("Agent 4: Reviewer", "Quality Assurance", api_token, model, logs, use_cache,
+                                  hedge=hedge, label=label),
+    }
+
+def run_pipeline(profile_data, api_token, model, logs=None, use_cache=True,
+                 on_token=None, on_result=None, poll=None, deadline_seconds=RUN_DEADLINE_SECONDS,
+                 timings=None, run_id=None, hedge=False, incremental=True, reused=None,
+                 checkpoint=True, resume=False, similar_threshold=None, shared=None, label=None, cancel=None):
+    """Run the four-agent pipeline without any UI.
+
+    `on_token(key, delta)` receives streamed text, `on_result(key, result)`
+    is called as each agent finishes and `poll()` runs periodically on the
+    calling thread. If `timings` is a dict it is filled with each agent's
+    duration and the run's total wall-clock time, in seconds. Agent spans
+    are recorded in METRICS under `run_id` (generated when not given).
+    With `hedge`, slow requests are raced against a backup model. With
+    `incremental`, agents whose inputs match a stored result are skipped;
+    their keys are added to the `reused` list if one is given.
+
+    With `checkpoint`, each agent's result is saved to the results store
+    under `run_id` as soon as it completes, and the checkpoints are dropped
+    once the whole run succeeds. With `resume`, agents checkpointed by an
+    earlier attempt of the same run (same profile and model) are not run
+    again.
+
+    With `similar_threshold` (0-1), Agents 1 and 2 are not run when a
+    stored run of the same model and target role has a profile at least
+    that similar (estimated Jaccard over word shingles); its analysis and
+    strategy are used instead and their keys are added to `reused`.
+
+    `shared` maps result keys to results, or Futures of results, produced
+    outside this pipeline (see run_fanout); those agents are not run here.
+    `label` is appended to the agents' names in the logs.
+
+    Setting `cancel` (a CancelToken) stops the run: agents not started yet
+    are skipped, and running ones stop at their next token, retry or
+    rate-limit wait. The run then fails with STOPPED_MESSAGE, keeping the
+    checkpoints of finished agents so it can be resumed. The deadline
+    (`deadline_seconds` from the start) is checked the same way and also
+    bounds each request's HTTP timeout.
+    Returns (results, error): `error` is the first failing agent's message,
+    or None when all four agents succeeded.
+    """
+    agents = build_agents(api_token, model, logs, use_cache, hedge, label)
+    store = get_store() if checkpoint or resume else None
+    started = time.monotonic()
+    deadline = started + deadline_seconds
+    timings = timings if timings is not None else {}
+    run_id = run_id or uuid.uuid4().hex
+    completed = {}
+    if store:
+        store.begin_checkpoint(run_id, profile_data, model, keep=resume)
+        if resume:
+            completed = store.load_checkpoints(run_id)
+    shortcut = {}
+    if similar_threshold is not None:
+        shortcut = similar_results(profile_data, model, similar_threshold, exclude=run_id)
+        completed = {**shortcut, **completed}
+    completed = {**completed, **(shared or {})}
+    for key, agent in agents.items():
+        agent.deadline = deadline
+        agent.cancel = cancel
+        agent.run_id = run_id
+        agent.incremental = incremental
+        agent.checkpoint_key = key if store else None
+        if on_token:
+            agent.on_token = lambda delta, key=key: on_token(key, delta)
+    
+    results = {}
+    try:
+        for key, result in run_agent_graph(agents, profile_data, poll=poll, completed=completed):
+            results[key] = result
+            if key in completed and key in shortcut and completed[key] == shortcut[key]:
+                agents[key].log_activity(f"🔁 Reused from a near-identical stored profile "
+                                         f"({shortcut['similarity']:.0%} similar, run {shortcut['run_id'][:8]})")
+                if reused is not None:
+                    reused.append(key)
+            elif key in (shared or {}):
+                agents[key].log_activity("🔗 Shared with the other target roles of this run")
+            elif key in completed:
+                agents[key].log_activity("📌 Restored from the previous attempt's checkpoint")
+            else:
+                timings[key] = round(agents[key].elapsed, 3)
+            if agents[key].reused and reused is not None:
+                reused.append(key)
+            if on_result:
+                on_result(key, result)
+    except InferenceError as e:
+        # Agents stopped by the token fail with whatever they were doing; report the stop itself
+        error = STOPPED_MESSAGE if cancel is not None and cancel.is_set() else str(e)
+        METRICS.record_run('Cancelled' if error == STOPPED_MESSAGE else type(e).__name__,
+                           time.monotonic() - started)
+        if store:
+            store.fail_checkpoint(run_id, error)
+        return results, error
+    finally:
+        timings['total'] = round(time.monotonic() - started, 3)
+    METRICS.record_run('ok', timings['total'])
+    if store:
+        store.clear_checkpoints(run_id)
+    return results, None
+
+def unique_roles(roles):
+    """Non-empty roles in order, dropping ones that normalize to an earlier role"""
+    seen, unique = set(), []
+    for role in roles:
+        key = role_key(role)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(role.strip())
+    return unique
+
+def run_fanout(profile_data, roles, api_token, model, logs=None, use_cache=True, on_token=None,
+               on_result=None, poll=None, deadline_seconds=RUN_DEADLINE_SECONDS, timings=None,
+               run_id=None, hedge=False, incremental=True, reused=None, cancel=None):
+    """Run the pipeline for several target roles of one profile at once.
+
+    Agent 1 analyzes the profile once for all roles, with the local ATS
+    check scored once per keyword family, and every role's Agent 2 reads
+    that shared analysis. Agents 2-4 then run per role, all roles
+    concurrently under the token's shared rate limiter, so K roles cost
+    1 + 3K requests instead of 4K. Agents 1 and 3 of every role also start
+    with the same profile block, whose KV cache backends can reuse.
+
+    Roles are deduplicated (unique_roles). Callbacks get the role first:
+    on_token(role, key, delta) and on_result(role, key, result). `timings`
+    and `reused` are filled per role, plus the overall 'total' in timings.
+    `cancel` and the deadline apply to every role as in run_pipeline.
+    Returns ({role: results}, {role: error or None}).
+    """
+    roles = unique_roles(roles)
+    run_id = run_id or uuid.uuid4().hex
+    timings = timings if timings is not None else {}
+    started = time.monotonic()
+    analyzer = build_agents(api_token, model, logs, use_cache, hedge, label="all roles")['agent1']
+    analyzer.deadline = started + deadline_seconds
+    analyzer.cancel = cancel
+    analyzer.run_id = run_id
+    analyzer.incremental = incremental
+    if on_token:
+        analyzer.on_token = lambda delta: [on_token(role, 'agent1', delta) for role in roles]
+    shared_profile = {**profile_data, 'target_role': " | ".join(roles), 'target_roles': roles}
+
+    executor = ThreadPoolExecutor(max_workers=len(roles) + 1, thread_name_prefix="fanout")
+    try:
+        shared = executor.submit(analyzer.run, shared_profile, {})
+        futures = {}
+        for index, role in enumerate(roles):
+            futures[role] = executor.submit(
+                run_pipeline, {**profile_data, 'target_role': role}, api_token, model, logs, use_cache,
+                (lambda key, delta, role=role: on_token(role, key, delta)) if on_token else None,
+                (lambda key, result, role=role: on_result(role, key, result)) if on_result else None,
+                deadline_seconds=deadline_seconds, timings=timings.setdefault(role, {}),
+                run_id=f"{run_id}_{index}", hedge=hedge, incremental=incremental,
+                reused=reused.setdefault(role, []) if reused is not None else None,
+                checkpoint=False, shared={'agent1': shared}, label=role, cancel=cancel)
+        while True:
+            _, running = wait(futures.values(), timeout=0.1 if poll else None)
+            if poll:
+                poll()
+            if not running:
+                break
+        results, errors = {}, {}
+        for role, future in futures.items():
+            results[role], errors[role] = future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        timings['total'] = round(time.monotonic() - started, 3)
+    if analyzer.elapsed is not None:
+        for role in roles:
+            timings[role]['agent1'] = round(analyzer.elapsed, 3)
+    return results, errors
+
+# Agents whose output depends on the profile only loosely enough to borrow from a near-duplicate
+SIMILAR_REUSABLE = ('agent1', 'agent2')
+
+def similar_results(profile_data, model, threshold, exclude=None):
+    """Agent 1/2 results of the closest stored run above `threshold` for the same model.
+
+    Returns {'agent1': ..., 'agent2': ..., 'similarity': score, 'run_id': id},
+    or {} when no stored run is similar enough.
+    """
+    for score, run in get_store().find_similar_runs(profile_data, threshold, limit=5, exclude=exclude,
+                                                    model=model):
+        if not all(run['results'].get(key) for key in SIMILAR_REUSABLE):
+            continue
+        return {**{key: run['results'][key] for key in SIMILAR_REUSABLE}, 'similarity': score, 'run_id': run['id']}
+    return {}
@@ -0,0 +1,165 @@
+"""HTTP API for the four-agent pipeline.
+
+Runs are queued on the process-wide JobQueue and served by its workers, so
+the number of concurrent pipelines is set here (JOB_WORKERS, JOB_QUEUE_SIZE)
+independently of how many UI processes submit to it:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+POST /jobs                 submit a profile (Authorization: Bearer hf_...)
+GET  /jobs/{id}            poll status and results
+GET  /jobs/{id}/events     long-poll progress events after ?since=N
+GET  /jobs/{id}/stream     the same events as Server-Sent Events
+POST /jobs/{id}/resume     re-run a failed job from its first incomplete agent
+POST /jobs/{id}/cancel     stop a queued or running job
+"""
+import asyncio
+import json
+import os
+from typing import List, Optional
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from agents import RUN_DEADLINE_SECONDS
+from backends import is_local
+from jobs import JobQueueFull, get_job_queue, job_state
+from metrics import METRICS
+from storage import get_store
+
+DEFAULT_MODEL = "Qwen/Qwen2.5-7B-Instruct"
+# Longest a single long-poll or SSE wait holds a request open
+MAX_WAIT_SECONDS = 30.0
+
+app = FastAPI(title="LinkedIn Multi-Agent Optimizer API")
+
+class ResumeRequest(BaseModel):
+    use_cache: bool = True
+    hedge: bool = False
+    incremental: bool = True
+    session_id: Optional[str] = Field(None, max_length=64)
+    heartbeat_seconds: Optional[float] = Field(None, ge=5)
+    api_token: Optional[str] = None
+
+class Profile(BaseModel):
+    target_role: Optional[str] = None
+    headline: Optional[str] = None
+    about: Optional[str] = None
+    experience: Optional[str] = None
+    skills: Optional[str] = None
+    education: Optional[str] = None
+
+class JobRequest(BaseModel):
+    profile: Profile
+    model: str = DEFAULT_MODEL
+    use_cache: bool = True
+    hedge: bool = False
+    incremental: bool = True
+    similar_threshold: Optional[float] = Field(None, ge=0.0, le=1.0,
+                                               description="Reuse Agent 1/2 results of a stored run at least "
+                                                           "this similar to the profile")
+    target_roles: Optional[List[str]] = Field(None, max_length=8,
+                                              description="Analyze the profile for several roles at once; "
+                                                          "Agent 1 is shared and Agents 2-4 run per role")
+    session_id: Optional[str] = Field(None, max_length=64,
+                                      description="Coalesce submissions: the same request returns the "
+                                                  "session's unfinished job, a different one stops it")
+    deadline_seconds: float = Field(RUN_DEADLINE_SECONDS, gt=0, le=RUN_DEADLINE_SECONDS,
+                                    description="Overall time budget of the run, HTTP timeouts included")
+    heartbeat_seconds: Optional[float] = Field(None, ge=5,
+                                               description="Stop the job if its events are not polled "
+                                                           "for this long")
+    api_token: Optional[str] = Field(None, description="Hugging Face token; prefer the Authorization header")
+
+def _token(request, authorization):
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return request.api_token or os.environ.get("HF_TOKEN")
+
+def _job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found or no longer in memory; GET /jobs/{id} for its stored result")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: JobRequest, authorization: Optional[str] = Header(None)):
+    api_token = _token(request, authorization)
+    if not api_token and not is_local(request.model):
+        raise HTTPException(401, "A Hugging Face token is required (Authorization: Bearer hf_...)")
+    try:
+        job = get_job_queue().submit(request.profile.model_dump(exclude_none=True), api_token, request.model,
+                                     use_cache=request.use_cache, hedge=request.hedge,
+                                     incremental=request.incremental,
+                                     similar_threshold=request.similar_threshold,
+                                     roles=request.target_roles, session_id=request.session_id,
+                                     deadline_seconds=request.deadline_seconds,
+                                     heartbeat_seconds=request.heartbeat_seconds)
+    except JobQueueFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "10"})
+    return job.to_dict()
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+def resume_job(job_id: str, request: ResumeRequest, authorization: Optional[str] = Header(None)):
+    api_token = _token(request, authorization)
+    inputs = get_store().get_checkpoint_run(job_id)
+    if inputs is None:
+        raise HTTPException(404, "No failed run to resume under this id")
+    if not api_token and not is_local(inputs['model']):
+        raise HTTPException(401, "A Hugging Face token is required (Authorization: Bearer hf_...)")
+    try:
+        job = get_job_queue().resume(job_id, api_token, use_cache=request.use_cache, hedge=request.hedge,
+                                     incremental=request.incremental, session_id=request.session_id,
+                                     heartbeat_seconds=request.heartbeat_seconds)
+    except KeyError:
+        raise HTTPException(404, "No failed run to resume under this id")
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    except JobQueueFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "10"})
+    return job.to_dict()
+
+@app.post("/jobs/{job_id}/cancel", status_code=202)
+def cancel_job(job_id: str):
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found or no longer in memory")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    state = job_state(job_id)
+    if state is None:
+        raise HTTPException(404, "Job not found")
+    return state
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str, since: int = Query(0, ge=0), wait: float = Query(10.0, ge=0)):
+    job = _job(job_id)
+    events = job.wait_events(since, min(wait, MAX_WAIT_SECONDS))
+    return {'events': events, 'next': since + len(events), 'status': job.status}
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, since: int = Query(0, ge=0)):
+    job = _job(job_id)
+
+    async def event_source():
+        cursor = since
+        while True:
+            events = await asyncio.to_thread(job.wait_events, cursor, MAX_WAIT_SECONDS)
+            for event in events:
+                yield f"id: {cursor}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                cursor += 1
+            if job.finished and cursor >= len(job.events):
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+@app.get("/health")
+def health():
+    return {'status': 'ok', **get_job_queue().stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return METRICS.to_prometheus()
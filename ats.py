@@ -0,0 +1,137 @@
+import re
+from functools import lru_cache
+
+# Keyword index per target-role family: canonical keyword -> aliases
+KEYWORD_FAMILIES = {
+    'servicenow_genai': {
+        'triggers': ('servicenow', 'gen ai', 'genai', 'generative ai'),
+        'keywords': {
+            'ServiceNow': ('servicenow', 'service now'),
+            'ITSM': ('itsm',),
+            'ITOM': ('itom',),
+            'CSM': ('csm', 'customer service management'),
+            'HRSD': ('hrsd', 'hr service delivery'),
+            'Generative AI': ('gen ai', 'genai', 'generative ai'),
+            'LLM': ('llm', 'llms', 'large language model', 'large language models'),
+            'Virtual Agent': ('virtual agent',),
+            'Chatbot': ('chatbot', 'chatbots', 'chat bot'),
+            'Flow Designer': ('flow designer',),
+            'Integration Hub': ('integration hub', 'integrationhub'),
+            'REST API': ('rest', 'restful', 'rest api', 'api', 'apis'),
+            'JavaScript': ('javascript', 'js'),
+            'Python': ('python',),
+            'Remote': ('remote', 'remotely', 'remote-first'),
+            'Distributed Teams': ('distributed',),
+            'Async Communication': ('async', 'asynchronous'),
+            'Agile': ('agile',),
+            'Scrum': ('scrum',),
+            'CI/CD': ('ci/cd', 'cicd', 'continuous integration', 'continuous delivery'),
+        },
+    },
+    'devops': {
+        'triggers': ('devops', 'sre', 'site reliability', 'platform engineer', 'cloud engineer'),
+        'keywords': {
+            'Kubernetes': ('kubernetes', 'k8s'),
+            'Docker': ('docker', 'containers'),
+            'Terraform': ('terraform',),
+            'Infrastructure as Code': ('infrastructure as code', 'iac'),
+            'AWS': ('aws', 'amazon web services'),
+            'Azure': ('azure',),
+            'GCP': ('gcp', 'google cloud'),
+            'CI/CD': ('ci/cd', 'cicd', 'continuous integration', 'continuous delivery'),
+            'GitHub Actions': ('github actions',),
+            'Jenkins': ('jenkins',),
+            'Ansible': ('ansible',),
+            'Linux': ('linux',),
+            'Python': ('python',),
+            'Monitoring': ('monitoring', 'observability', 'prometheus', 'grafana'),
+            'Remote': ('remote', 'remotely', 'remote-first'),
+            'Agile': ('agile', 'scrum'),
+        },
+    },
+    'remote': {
+        'triggers': (),
+        'keywords': {
+            'Remote': ('remote', 'remotely', 'remote-first'),
+            'Distributed Teams': ('distributed',),
+            'Async Communication': ('async', 'asynchronous'),
+            'Collaboration': ('collaboration', 'collaborative', 'cross-functional'),
+            'Communication': ('communication', 'communicator'),
+            'Self-Directed': ('self-directed', 'self-motivated', 'autonomous', 'independently'),
+            'Agile': ('agile', 'scrum', 'kanban'),
+            'Project Management': ('project management', 'stakeholder', 'stakeholders'),
+            'Problem Solving': ('problem solving', 'problem-solving', 'troubleshooting'),
+            'Leadership': ('leadership', 'mentoring', 'mentored'),
+        },
+    },
+}
+DEFAULT_FAMILY = 'remote'
+
+PROFILE_FIELDS = ('headline', 'about', 'experience', 'skills')
+MAX_NGRAM = 3
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#/.\-]*[a-z0-9+#]|[a-z0-9]")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def ngram_set(text, n=MAX_NGRAM):
+    """All 1..n word n-grams of `text`, joined by single spaces"""
+    tokens = tokenize(text)
+    grams = set()
+    for size in range(1, n + 1):
+        for i in range(len(tokens) - size + 1):
+            grams.add(" ".join(tokens[i:i + size]))
+    return grams
+
+def _build_index():
+    # Aliases are normalized with the same tokenizer used on profiles
+    return {
+        family: {keyword: frozenset(" ".join(tokenize(alias)) for alias in aliases)
+                 for keyword, aliases in spec['keywords'].items()}
+        for family, spec in KEYWORD_FAMILIES.items()
+    }
+
+KEYWORD_INDEX = _build_index()
+
+def role_family(target_role):
+    role = (target_role or '').lower()
+    for family, spec in KEYWORD_FAMILIES.items():
+        if any(trigger in role for trigger in spec['triggers']):
+            return family
+    return DEFAULT_FAMILY
+
+def family_keywords(target_role):
+    return list(KEYWORD_FAMILIES[role_family(target_role)]['keywords'])
+
+@lru_cache(maxsize=1024)
+def _field_grams(text):
+    return frozenset(ngram_set(text))
+
+def score_profile(profile_data):
+    """Deterministic ATS keyword coverage for the profile's target-role family.
+
+    Returns a dict with the family, a 0-100 coverage score, and the matched
+    and missing keywords (matched maps keyword -> fields it appears in).
+    """
+    family = role_family(profile_data.get('target_role'))
+    grams = {field: _field_grams(profile_data.get(field) or '') for field in PROFILE_FIELDS}
+    matched, missing = {}, []
+    for keyword, aliases in KEYWORD_INDEX[family].items():
+        fields = [field for field in PROFILE_FIELDS if not aliases.isdisjoint(grams[field])]
+        if fields:
+            matched[keyword] = fields
+        else:
+            missing.append(keyword)
+    total = len(KEYWORD_INDEX[family])
+    return {
+        'family': family,
+        'score': round(100 * len(matched) / total) if total else 0,
+        'matched': matched,
+        'missing': missing,
+    }
+
+def format_for_prompt(ats, limit=8):
+    """Compact summary of a score_profile() result for an agent prompt"""
+    missing = ", ".join(ats['missing'][:limit]) or "none"
+    present = ", ".join(list(ats['matched'])[:limit]) or "none"
+    return f"{ats['score']}/100 keyword coverage. Present: {present}. Missing: {missing}"
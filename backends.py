@@ -0,0 +1,304 @@
+import copy
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from cache import RESPONSE_CACHE, cache_key
+from inference import (TEMPERATURE, Cancelled, DeadlineExceeded, EmptyResponseError, InferenceError,
+                       hf_generate)
+
+# Models named "local:<model id or path>" run on this machine instead of the HF API
+LOCAL_PREFIX = "local:"
+LOCAL_MODEL = os.environ.get("LOCAL_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+# Requests arriving within LOCAL_BATCH_WINDOW seconds of each other share one generate() call
+LOCAL_MAX_BATCH = int(os.environ.get("LOCAL_MAX_BATCH", "4"))
+LOCAL_BATCH_WINDOW = float(os.environ.get("LOCAL_BATCH_WINDOW", "0.05"))
+# Prompt prefixes whose KV cache is kept for reuse
+LOCAL_PREFIX_CACHE_SIZE = 8
+
+def is_local(model):
+    return bool(model) and model.startswith(LOCAL_PREFIX)
+
+class RemoteBackend:
+    """Hugging Face Inference API (or INFERENCE_ENDPOINT) through hf_generate"""
+    name = "remote"
+
+    def __init__(self, api_token, endpoint=None):
+        self.api_token = api_token
+        self.endpoint = endpoint
+
+    def generate(self, model, prompt, max_length=500, prefix=None, **options):
+        # Shared-prefix reuse is left to the server (TGI caches prefixes itself)
+        return hf_generate(self.api_token, model, prompt, max_length, self.endpoint, **options)
+
+class _LocalRequest:
+    def __init__(self, prompt, prefix, max_length, on_token, cancel, deadline):
+        self.prompt = prompt
+        self.prefix = prefix
+        self.max_length = max_length
+        self.on_token = on_token
+        self.cancel = cancel
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.started = None
+        self.first_token = None
+        self.text = None
+        self.error = None
+        self.emitted = ""
+        self.token_ids = []
+        self.finished = False
+        self.done = threading.Event()
+
+    @property
+    def stopped(self):
+        if self.finished or (self.cancel is not None and self.cancel.is_set()):
+            return True
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+class LocalBackend:
+    """Small instruct model on this machine's CPU, run with transformers.
+
+    A single worker thread owns the model. Requests that arrive together
+    are grouped by their shared prompt head: the chat-template header plus
+    the `prefix` the caller marks as shared (e.g. the profile block Agents 1
+    and 3 both start with). Each group is one batched generate() call on
+    top of the head's KV cache, which is computed once and kept in a small
+    LRU. Tails are padded between head and tail, so every row continues
+    from the same cached positions.
+    """
+    name = "local"
+
+    def __init__(self, model_name=LOCAL_MODEL, max_batch=LOCAL_MAX_BATCH, batch_window=LOCAL_BATCH_WINDOW,
+                 prefix_cache_size=LOCAL_PREFIX_CACHE_SIZE):
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.prefix_cache_size = prefix_cache_size
+        self.stats = {'requests': 0, 'batches': 0, 'prefix_hits': 0, 'prefix_misses': 0}
+        self._requests = queue.Queue()
+        self._prefix_caches = OrderedDict()
+        self._load_lock = threading.Lock()
+        self._model = None
+        self._tokenizer = None
+
+    def generate(self, model, prompt, max_length=500, prefix=None, use_cache=True, on_token=None,
+                 deadline=None, span=None, cancel=None, **_):
+        span = span if span is not None else {}
+        key = cache_key(model, prompt, max_length, TEMPERATURE)
+        if use_cache:
+            cached = RESPONSE_CACHE.get(key)
+            if cached is not None:
+                span['cache_hit'] = True
+                if on_token:
+                    on_token(cached)
+                return cached
+        if deadline is not None and time.monotonic() > deadline:
+            raise DeadlineExceeded("⏱️ Run deadline exceeded before the local model could start.")
+        self._load()
+
+        request = _LocalRequest(prompt, prefix if prefix and prompt.startswith(prefix) else None,
+                                max_length, on_token, cancel, deadline)
+        self._requests.put(request)
+        request.done.wait()
+        started = request.started or request.enqueued
+        span['queue_wait'] = span.get('queue_wait', 0.0) + started - request.enqueued
+        span['request_latency'] = span.get('request_latency', 0.0) + time.monotonic() - started
+        if request.first_token is not None:
+            span['ttft'] = request.first_token - started
+        if request.error is not None:
+            raise request.error
+
+        if use_cache:
+            RESPONSE_CACHE.put(key, request.text)
+        return request.text
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is not None:
+                return
+            try:
+                import torch
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+            except ImportError:
+                raise InferenceError("❌ Local models need `pip install transformers torch`.")
+            try:
+                tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                model = AutoModelForCausalLM.from_pretrained(self.model_name, dtype=torch.float32)
+            except (OSError, ValueError) as e:
+                raise InferenceError(f"❌ Could not load local model {self.model_name}: {str(e)[:200]}")
+            model.eval()
+            self._tokenizer, self._model = tokenizer, model
+            threading.Thread(target=self._serve, name="local-backend", daemon=True).start()
+
+    def _split(self, request):
+        """Chat-formatted prompt as (head, tail) text, head being the cacheable part"""
+        tokenizer = self._tokenizer
+        if tokenizer.chat_template:
+            text = tokenizer.apply_chat_template([{"role": "user", "content": request.prompt}],
+                                                 tokenize=False, add_generation_prompt=True)
+        else:
+            text = request.prompt
+        start = text.find(request.prompt)
+        if start < 0:
+            return "", text
+        head_end = start + len(request.prefix or "")
+        return text[:head_end], text[head_end:]
+
+    def _serve(self):
+        while True:
+            batch = [self._requests.get()]
+            window_ends = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = window_ends - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            groups = OrderedDict()
+            for request in batch:
+                if request.stopped:
+                    self._fail_stopped(request)
+                    continue
+                head, tail = self._split(request)
+                groups.setdefault(head, []).append((request, tail))
+            for head, group in groups.items():
+                try:
+                    self._run_batch(head, group)
+                except Exception as e:
+                    for request, _ in group:
+                        if not request.done.is_set():
+                            request.error = InferenceError(f"❌ Local model error: {str(e)[:200]}")
+                            request.done.set()
+
+    def _prefix_cache(self, head_ids):
+        import torch
+        from transformers import DynamicCache
+        key = tuple(head_ids)
+        cache = self._prefix_caches.get(key)
+        if cache is not None:
+            self._prefix_caches.move_to_end(key)
+            self.stats['prefix_hits'] += 1
+            return cache
+        self.stats['prefix_misses'] += 1
+        cache = DynamicCache()
+        with torch.no_grad():
+            self._model(input_ids=torch.tensor([head_ids]), past_key_values=cache, use_cache=True)
+        self._prefix_caches[key] = cache
+        while len(self._prefix_caches) > self.prefix_cache_size:
+            self._prefix_caches.popitem(last=False)
+        return cache
+
+    def _run_batch(self, head, group):
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+        from transformers.generation.streamers import BaseStreamer
+        tokenizer, model = self._tokenizer, self._model
+        requests = [request for request, _ in group]
+        head_ids = tokenizer(head, add_special_tokens=False).input_ids if head else []
+        tails = [tokenizer(tail, add_special_tokens=False).input_ids for _, tail in group]
+        width = max(len(tail) for tail in tails)
+        pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        # Padding sits between the shared head and each tail, so the cached head stays aligned
+        input_ids = torch.tensor([head_ids + [pad_id] * (width - len(tail)) + tail for tail in tails])
+        attention_mask = torch.tensor([[1] * len(head_ids) + [0] * (width - len(tail)) + [1] * len(tail)
+                                       for tail in tails])
+        past = None
+        if head_ids:
+            past = copy.deepcopy(self._prefix_cache(head_ids))
+            if len(group) > 1:
+                past.batch_repeat_interleave(len(group))
+        eos = model.generation_config.eos_token_id
+        eos_ids = set(eos if isinstance(eos, list) else [eos if eos is not None else tokenizer.eos_token_id])
+
+        def finalize(request):
+            if request.done.is_set():
+                return
+            if request.error is None:
+                request.text = tokenizer.decode(request.token_ids, skip_special_tokens=True).strip()
+                if request.cancel is not None and request.cancel.is_set():
+                    request.error = Cancelled("⏹️ Request cancelled.")
+                elif not request.finished and request.stopped:
+                    request.error = DeadlineExceeded("⏱️ Run deadline exceeded during local generation.")
+                elif not request.text:
+                    request.error = EmptyResponseError("⚠️ Model returned empty response. Try again.")
+            request.done.set()
+
+        class RowStreamer(BaseStreamer):
+            # generate() first passes the prompt, then one token per row per step
+            def __init__(self):
+                self.prompt_seen = False
+
+            def put(self, value):
+                if not self.prompt_seen:
+                    self.prompt_seen = True
+                    return
+                for request, token in zip(requests, value.tolist()):
+                    if request.finished:
+                        continue
+                    if token in eos_ids:
+                        request.finished = True
+                        finalize(request)
+                        continue
+                    request.token_ids.append(token)
+                    text = tokenizer.decode(request.token_ids, skip_special_tokens=True)
+                    if text.endswith("\ufffd"):
+                        continue
+                    delta, request.emitted = text[len(request.emitted):], text
+                    if delta and request.first_token is None:
+                        request.first_token = time.monotonic()
+                    if delta and request.on_token:
+                        try:
+                            request.on_token(delta)
+                        except Exception as e:
+                            request.error = e if isinstance(e, InferenceError) else InferenceError(str(e))
+                            request.finished = True
+                    if len(request.token_ids) >= request.max_length:
+                        request.finished = True
+                    if request.finished:
+                        # Release this row's caller now rather than when the longest row ends
+                        finalize(request)
+
+            def end(self):
+                pass
+
+        class RowStop(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return torch.tensor([request.stopped for request in requests])
+
+        started = time.monotonic()
+        for request in requests:
+            request.started = started
+        self.stats['batches'] += 1
+        self.stats['requests'] += len(requests)
+        with torch.no_grad():
+            model.generate(input_ids=input_ids, attention_mask=attention_mask, past_key_values=past,
+                           max_new_tokens=max(request.max_length for request in requests),
+                           do_sample=True, temperature=TEMPERATURE, pad_token_id=pad_id,
+                           streamer=RowStreamer(), stopping_criteria=StoppingCriteriaList([RowStop()]))
+        for request in requests:
+            finalize(request)
+
+    @staticmethod
+    def _fail_stopped(request):
+        if request.cancel is not None and request.cancel.is_set():
+            request.error = Cancelled("⏹️ Request cancelled.")
+        else:
+            request.error = DeadlineExceeded("⏱️ Run deadline exceeded while waiting for the local model.")
+        request.done.set()
+
+_local_backends = {}
+_local_backends_lock = threading.Lock()
+
+def get_backend(model, api_token=None, endpoint=None):
+    """Backend serving `model`: a shared LocalBackend for "local:" models, else the HF API"""
+    if not is_local(model):
+        return RemoteBackend(api_token, endpoint)
+    name = model[len(LOCAL_PREFIX):] or LOCAL_MODEL
+    with _local_backends_lock:
+        backend = _local_backends.get(name)
+        if backend is None:
+            backend = _local_backends[name] = LocalBackend(name)
+        return backend
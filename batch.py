@@ -0,0 +1,165 @@
+"""Headless batch mode: run the four-agent pipeline over a JSONL file of profiles.
+
+Each input line is a JSON object with the same fields the Browser Console
+import produces (headline, about, experience, skills, target_role) and an
+optional "id". Results are appended to the output JSONL as they finish, so
+an interrupted batch can be resumed by re-running the same command. A
+profile that failed part-way continues from its last completed agent.
+
+    python batch.py profiles.jsonl results.jsonl --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED, FIRST_COMPLETED
+from datetime import datetime
+from agents import run_pipeline
+from backends import is_local
+from storage import get_store
+
+DEFAULT_MODEL = "Qwen/Qwen2.5-7B-Instruct"
+
+def profile_id(profile):
+    """Stable id for a profile line: its "id" field, or a hash of its content"""
+    if profile.get('id'):
+        return str(profile['id'])
+    payload = json.dumps(profile, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def read_profiles(path, on_invalid=None):
+    """Profile objects of a JSONL file; `on_invalid(line_no)` is called for every line that is not one"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                profile = json.loads(line)
+            except ValueError:
+                print(f"⚠️ Skipping invalid JSON on line {line_no}", file=sys.stderr)
+                if on_invalid:
+                    on_invalid(line_no)
+                continue
+            if not isinstance(profile, dict):
+                print(f"⚠️ Skipping line {line_no}: expected a JSON object, got {type(profile).__name__}",
+                      file=sys.stderr)
+                if on_invalid:
+                    on_invalid(line_no)
+                continue
+            yield profile
+
+def completed_ids(path):
+    """Ids already written successfully to the output file; truncated or foreign lines are ignored"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('id') and not record.get('error'):
+                done.add(record['id'])
+    return done
+
+def process_profile(profile, api_token, model, use_cache, hedge=False, similar_threshold=None):
+    started = time.monotonic()
+    run_id = f"batch_{profile_id(profile)}"
+    try:
+        # A stable run id lets a re-run of a failed profile resume from its checkpoints
+        results, error = run_pipeline(profile, api_token, model, use_cache=use_cache, hedge=hedge,
+                                      incremental=use_cache, run_id=run_id, resume=True,
+                                      similar_threshold=similar_threshold)
+        if similar_threshold is not None and not error:
+            # Later near-duplicates in the same batch can then borrow from this one
+            get_store().save_run(profile, results, model=model, name=run_id, run_id=run_id)
+    except Exception as e:
+        results, error = {}, f"❌ Error: {str(e)[:200]}"
+    return {
+        'id': profile_id(profile),
+        'profile': profile,
+        'results': results,
+        'error': error,
+        'model': model,
+        'elapsed': round(time.monotonic() - started, 3),
+        'timestamp': datetime.now().isoformat()
+    }
+
+def run_batch(input_path, output_path, api_token, model=DEFAULT_MODEL, workers=4,
+              use_cache=True, progress_every=10.0, hedge=False, similar_threshold=None):
+    """Process every pending profile with at most `workers` pipelines in flight"""
+    skip = completed_ids(output_path)
+    counts = {'ok': 0, 'failed': 0, 'skipped': 0}
+    started = last_report = time.monotonic()
+
+    def report(final=False):
+        elapsed = time.monotonic() - started
+        processed = counts['ok'] + counts['failed']
+        rate = processed / elapsed * 60 if elapsed else 0.0
+        label = "Done" if final else "Progress"
+        print(f"{label}: {counts['ok']} ok, {counts['failed']} failed, {counts['skipped']} skipped "
+              f"| {rate:.1f} profiles/min | {elapsed:.0f}s", file=sys.stderr)
+
+    with open(output_path, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+        running = set()
+
+        def drain(return_when):
+            nonlocal running, last_report
+            done, running = wait(running, return_when=return_when)
+            for future in done:
+                record = future.result()
+                counts['failed' if record['error'] else 'ok'] += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if time.monotonic() - last_report >= progress_every:
+                last_report = time.monotonic()
+                report()
+
+        def invalid(line_no):
+            counts['failed'] += 1
+
+        for profile in read_profiles(input_path, invalid):
+            if profile_id(profile) in skip:
+                counts['skipped'] += 1
+                continue
+            running.add(executor.submit(process_profile, profile, api_token, model, use_cache, hedge,
+                                         similar_threshold))
+            if len(running) >= workers:
+                drain(FIRST_COMPLETED)
+        if running:
+            drain(ALL_COMPLETED)
+
+    report(final=True)
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimize LinkedIn profiles from a JSONL file")
+    parser.add_argument("input", help="JSONL file with one profile per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--model", default=DEFAULT_MODEL,
+                        help="HF model id, or local:<model id or path> to run on this machine's CPU")
+    parser.add_argument("--token", default=os.environ.get("HF_TOKEN"),
+                        help="Hugging Face token (default: $HF_TOKEN)")
+    parser.add_argument("--workers", type=int, default=4, help="Profiles processed concurrently")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache and stored agent results")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Race slow requests against a backup model (see hedging.py)")
+    parser.add_argument("--similar", type=float, metavar="THRESHOLD",
+                        help="Reuse Agent 1/2 results of a stored run whose profile is at least this similar "
+                             "(0-1, e.g. 0.9); successful profiles are stored for later ones to reuse")
+    args = parser.parse_args(argv)
+
+    if not args.token and not is_local(args.model):
+        parser.error("a Hugging Face token is required (--token or $HF_TOKEN)")
+    counts = run_batch(args.input, args.output, args.token, args.model,
+                       max(1, args.workers), not args.no_cache, hedge=args.hedge,
+                       similar_threshold=args.similar)
+    return 1 if counts['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
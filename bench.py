@@ -0,0 +1,253 @@
+"""Benchmark the four-agent pipeline against a local mock inference server.
+
+Starts an OpenAI-compatible chat-completions stand-in with configurable
+latency, token rate and error injection, points inference at it and runs
+the pipeline at each requested concurrency level. Writes a JSON report that
+can be compared across commits:
+
+    python bench.py --runs 20 --concurrency 1,4,16 --output bench.json
+    python bench.py --runs 20 --compare bench.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_TOKEN = "hf_benchmark"
+BENCH_MODEL = "mock/linkedin-bench"
+SAMPLE_PROFILE = {
+    'target_role': "ServiceNow Developer - Gen AI",
+    'headline': "ServiceNow Developer | ITSM | JavaScript",
+    'about': "ServiceNow developer with 5 years building ITSM workflows, catalog items and "
+             "REST integrations. Recently prototyping LLM-powered virtual agents. " * 3,
+    'experience': "Acme Corp - ServiceNow Developer (2020-2024)\n"
+                  "Built Flow Designer automations and Integration Hub spokes for HR and IT.\n" * 3,
+    'skills': "ServiceNow, ITSM, JavaScript, REST API, Flow Designer, Python, Agile",
+}
+
+class MockConfig:
+    def __init__(self, latency=0.2, token_rate=200.0, completion_tokens=120,
+                 error_429=0.0, error_503=0.0, error_timeout=0.0, hang_seconds=2.0,
+                 slow_fraction=0.0, slow_latency=5.0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.error_429 = error_429
+        self.error_503 = error_503
+        self.error_timeout = error_timeout
+        self.hang_seconds = hang_seconds
+        # Stragglers: this fraction of requests waits slow_latency instead of latency
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+
+def make_handler(config):
+    class MockInferenceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                return self._send_json(404, {"error": "Not found"})
+
+            roll = random.random()
+            if roll < config.error_429:
+                return self._send_json(429, {"error": "Rate limit reached"}, {"Retry-After": "1"})
+            roll -= config.error_429
+            if roll < config.error_503:
+                return self._send_json(503, {"error": "Model is currently loading"})
+            roll -= config.error_503
+            if roll < config.error_timeout:
+                time.sleep(config.hang_seconds)
+                return self._send_json(504, {"error": "Gateway timeout"})
+
+            time.sleep(config.slow_latency if random.random() < config.slow_fraction else config.latency)
+            n_tokens = min(config.completion_tokens, payload.get('max_tokens') or config.completion_tokens)
+            words = [f"word{i}" for i in range(n_tokens)]
+            model = payload.get('model', BENCH_MODEL)
+            if payload.get('stream'):
+                return self._stream(model, words)
+            time.sleep(n_tokens / config.token_rate)
+            self._send_json(200, {
+                "id": uuid.uuid4().hex, "object": "chat.completion", "created": int(time.time()),
+                "model": model, "system_fingerprint": "mock",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": n_tokens, "total_tokens": n_tokens},
+            })
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, model, words):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            chunk_id = uuid.uuid4().hex
+            self.close_connection = True
+            try:
+                for i, word in enumerate(words):
+                    time.sleep(1 / config.token_rate)
+                    chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "system_fingerprint": "mock",
+                             "choices": [{"index": 0, "finish_reason": None, "logprobs": None,
+                                          "delta": {"role": "assistant", "content": word + " "}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # Client hung up mid-stream, e.g. a cancelled hedge request
+                pass
+
+    return MockInferenceHandler
+
+def start_mock_server(config, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return round(values[index], 4)
+
+def summarize(values):
+    return {'p50': percentile(values, 50), 'p95': percentile(values, 95),
+            'p99': percentile(values, 99), 'mean': round(sum(values) / len(values), 4) if values else None}
+
+def run_once(stream, hedge=False, model=BENCH_MODEL):
+    from agents import run_pipeline
+    started = time.monotonic()
+    first_token = []
+    def on_token(key, delta):
+        if not first_token:
+            first_token.append(time.monotonic() - started)
+    timings = {}
+    results, error = run_pipeline(SAMPLE_PROFILE, BENCH_TOKEN, model, use_cache=False,
+                                  on_token=on_token if stream else None, timings=timings, hedge=hedge,
+                                  incremental=False, checkpoint=False)
+    return {'latency': time.monotonic() - started, 'ttft': first_token[0] if first_token else None,
+            'timings': timings, 'error': error}
+
+def run_level(concurrency, runs, stream, hedge=False, model=BENCH_MODEL):
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(lambda _: run_once(stream, hedge, model), range(runs)))
+    wall = time.monotonic() - started
+    ok = [s for s in samples if not s['error']]
+    return {
+        'concurrency': concurrency,
+        'runs': runs,
+        'failed': len(samples) - len(ok),
+        'wall_seconds': round(wall, 3),
+        'throughput_runs_per_min': round(len(ok) / wall * 60, 2) if wall else None,
+        'latency': summarize([s['latency'] for s in ok]),
+        'ttft': summarize([s['ttft'] for s in ok if s['ttft'] is not None]),
+        'agents': {key: summarize([s['timings'][key] for s in ok if key in s['timings']])
+                   for key in ('agent1', 'agent2', 'agent3', 'agent4')},
+        'errors': sorted({s['error'] for s in samples if s['error']}),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline):
+    """Print p50/p95 end-to-end latency deltas against a previous report"""
+    previous = {level['concurrency']: level for level in baseline['levels']}
+    print(f"Compared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '')[:19]}):")
+    for level in report['levels']:
+        base = previous.get(level['concurrency'])
+        if not base:
+            continue
+        for stat in ('p50', 'p95'):
+            new, old = level['latency'][stat], base['latency'][stat]
+            if new is None or not old:
+                continue
+            print(f"  c={level['concurrency']:<3} {stat}: {old:.3f}s -> {new:.3f}s ({(new - old) / old * 100:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a mock inference server")
+    parser.add_argument("--model", default=BENCH_MODEL,
+                        help="Model to benchmark; local:<model id or path> skips the mock server entirely")
+    parser.add_argument("--runs", type=int, default=10, help="Pipeline runs per concurrency level")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock per-request latency (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Mock tokens generated per second")
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of requests answered 429")
+    parser.add_argument("--error-503", type=float, default=0.0, help="Fraction of requests answered 503")
+    parser.add_argument("--error-timeout", type=float, default=0.0, help="Fraction of requests that hang")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Fraction of requests that straggle")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Latency of straggling requests (s)")
+    parser.add_argument("--rpm", type=float, default=100000, help="Client-side requests/min limit")
+    parser.add_argument("--no-stream", action="store_true", help="Use non-streaming completions")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow requests with a backup model")
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--compare", help="Previous report to compare against")
+    args = parser.parse_args(argv)
+
+    import inference
+    from ratelimit import configure_rate_limiter
+
+    config = MockConfig(args.latency, args.token_rate, args.completion_tokens,
+                        args.error_429, args.error_503, args.error_timeout,
+                        slow_fraction=args.slow_fraction, slow_latency=args.slow_latency)
+    server, url = start_mock_server(config)
+    inference.INFERENCE_ENDPOINT = url
+    configure_rate_limiter(BENCH_TOKEN, args.rpm, args.rpm * 10000)
+
+    levels = []
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        level = run_level(concurrency, args.runs, not args.no_stream, args.hedge, args.model)
+        levels.append(level)
+        ttft = level['ttft']['p50']
+        print(f"c={concurrency:<3} p50={level['latency']['p50']}s p95={level['latency']['p95']}s "
+              f"ttft_p50={f'{ttft}s' if ttft is not None else 'n/a'} "
+              f"{level['throughput_runs_per_min']} runs/min failed={level['failed']}", file=sys.stderr)
+    server.shutdown()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'config': vars(args),
+        'levels': levels,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
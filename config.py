@@ -0,0 +1,5 @@
+import os
+
+# Data directory (override with LINKEDIN_DATA_DIR for batch/server deployments)
+DATA_DIR = os.environ.get("LINKEDIN_DATA_DIR", "linkedin_data")
+os.makedirs(DATA_DIR, exist_ok=True)
@@ -0,0 +1,46 @@
+import os
+from backends import is_local
+from metrics import METRICS
+
+# Models a slow request can be hedged to, in preference order
+HEDGE_MODELS = tuple(
+    model.strip() for model in os.environ.get(
+        "HF_HEDGE_MODELS",
+        "Qwen/Qwen2.5-7B-Instruct,meta-llama/Llama-3.2-3B-Instruct,"
+        "mistralai/Mistral-7B-Instruct-v0.3,google/gemma-2-9b-it",
+    ).split(",") if model.strip()
+)
+# The backup fires once the primary is slower than this quantile of its recent requests
+HEDGE_QUANTILE = float(os.environ.get("HF_HEDGE_QUANTILE", "0.95"))
+# Thresholds (seconds) while a model has too little history for a quantile
+HEDGE_DEFAULT_TTFT = 5.0
+HEDGE_DEFAULT_LATENCY = 20.0
+HEDGE_MIN_DELAY = 0.5
+
+def hedge_delay(model, streaming):
+    """Seconds to wait on `model` before firing a backup request.
+
+    Streamed requests are judged by time to first token, others by full
+    request latency, each at HEDGE_QUANTILE of the model's recent requests.
+    """
+    observed = METRICS.latency_quantile(model, HEDGE_QUANTILE, ttft=streaming)
+    if observed is None:
+        return HEDGE_DEFAULT_TTFT if streaming else HEDGE_DEFAULT_LATENCY
+    return max(HEDGE_MIN_DELAY, observed)
+
+def hedge_fallback(model):
+    """Backup model for `model`: the fastest other hedge model by median latency.
+
+    Models without enough history keep their HEDGE_MODELS order, after the
+    measured ones. Only models of the same kind qualify: a local model is
+    never hedged to the remote API, which would send an offline run's
+    profile out of the machine. Returns None when there is no other model
+    to hedge to.
+    """
+    candidates = [m for m in HEDGE_MODELS if m != model and is_local(m) == is_local(model)]
+    if not candidates:
+        return None
+    def median(m):
+        value = METRICS.latency_quantile(m, 0.5)
+        return (value is None, value or 0.0)
+    return min(candidates, key=median)
@@ -0,0 +1,174 @@
+"""Columnar export of every stored run, plus score analytics over the export.
+
+Runs are read from the results store in batches and written as they are
+read, so memory stays flat however long the history is:
+
+    python history_export.py export runs.parquet      (or runs.arrow)
+    python history_export.py summary runs.parquet --by model,role
+
+Needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import os
+import sys
+import time
+from output_schema import SCORE_COLUMNS, result_scores
+from similarity import role_key
+from storage import get_store
+
+AGENT_KEYS = ('agent1', 'agent2', 'agent3', 'agent4')
+PROFILE_COLUMNS = ('headline', 'about', 'experience', 'skills')
+EXPORT_BATCH_ROWS = 2000
+# Width of the score histogram buckets in summary()
+SCORE_BUCKET = 10
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("History export needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+def export_schema():
+    pa = _pyarrow()
+    return pa.schema(
+        [('id', pa.string()), ('created_at', pa.string()), ('name', pa.string()), ('model', pa.string()),
+         ('target_role', pa.string()), ('role', pa.string()), ('profile_hash', pa.string())]
+        + [(field, pa.string()) for field in PROFILE_COLUMNS]
+        + [(key, pa.string()) for key in AGENT_KEYS]
+        + [(column, pa.int16()) for column in SCORE_COLUMNS]
+        + [(f"seconds_{key}", pa.float32()) for key in AGENT_KEYS + ('total',)]
+    )
+
+def run_row(run):
+    """One export row for a stored run"""
+    profile, results, timings = run['profile'], run['results'], run['timings'] or {}
+    scores = run.get('scores') or {}
+    if any(scores.get(column) is None for column in SCORE_COLUMNS):
+        scores = {**result_scores(results), **{k: v for k, v in scores.items() if v is not None}}
+    row = {
+        'id': run['id'],
+        'created_at': run['timestamp'],
+        'name': run['name'],
+        'model': run['model'],
+        'target_role': run['target_role'],
+        'role': role_key(run['target_role']),
+        'profile_hash': run['profile_hash'],
+    }
+    row.update({field: profile.get(field) for field in PROFILE_COLUMNS})
+    row.update({key: results.get(key) for key in AGENT_KEYS})
+    row.update({column: scores.get(column) for column in SCORE_COLUMNS})
+    row.update({f"seconds_{key}": timings.get(key) for key in AGENT_KEYS + ('total',)})
+    return row
+
+def export_runs(path, store=None, batch_rows=EXPORT_BATCH_ROWS):
+    """Write every stored run to `path` (Parquet, or Arrow IPC for .arrow/.feather); returns the row count"""
+    pa = _pyarrow()
+    store = store or get_store()
+    schema = export_schema()
+    if path.endswith(('.arrow', '.feather')):
+        writer = pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+    else:
+        writer = pa.parquet.ParquetWriter(path, schema, compression='zstd')
+    count, rows = 0, []
+    try:
+        for run in store.iter_runs(batch_size=batch_rows):
+            rows.append(run_row(run))
+            if len(rows) >= batch_rows:
+                writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+                count, rows = count + len(rows), []
+        if rows:
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+            count += len(rows)
+    finally:
+        writer.close()
+    return count
+
+def _read(path, columns):
+    pa = _pyarrow()
+    if path.endswith(('.arrow', '.feather')):
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all().select(columns)
+    return pa.parquet.read_table(path, columns=columns)
+
+def summary(path, by=('model',)):
+    """Per-group run counts, score averages/medians and mean run time from an export.
+
+    Returns (groups, histogram): `groups` is a list of dicts, one per
+    combination of the `by` columns (e.g. 'model', 'role'); `histogram`
+    counts each score per group in SCORE_BUCKET-wide buckets.
+    """
+    pa = _pyarrow()
+    pc = pa.compute
+    by = list(by)
+    table = _read(path, by + list(SCORE_COLUMNS) + ['seconds_total'])
+    aggregations = [(by[0], 'count')]
+    for column in SCORE_COLUMNS:
+        aggregations += [(column, 'mean'), (column, 'approximate_median'), (column, 'count')]
+    aggregations.append(('seconds_total', 'mean'))
+    groups = []
+    for row in table.group_by(by).aggregate(aggregations).to_pylist():
+        group = {column: row[column] for column in by}
+        group['runs'] = row[f"{by[0]}_count"]
+        for column in SCORE_COLUMNS:
+            group[f"{column}_mean"] = row[f"{column}_mean"]
+            group[f"{column}_median"] = row[f"{column}_approximate_median"]
+            group[f"{column}_runs"] = row[f"{column}_count"]
+        group['seconds_total_mean'] = row['seconds_total_mean']
+        groups.append(group)
+    groups.sort(key=lambda group: -group['runs'])
+
+    histogram = []
+    for column in SCORE_COLUMNS:
+        scored = table.filter(pc.is_valid(table[column]))
+        if not scored.num_rows:
+            continue
+        bucket = pc.multiply(pc.divide(scored[column].cast(pa.int32()), SCORE_BUCKET), SCORE_BUCKET)
+        counts = scored.select(by).append_column('bucket', bucket).group_by(by + ['bucket']).aggregate(
+            [('bucket', 'count')])
+        histogram += [{**{c: row[c] for c in by}, 'score': column, 'bucket': row['bucket'], 'runs': row['bucket_count']}
+                      for row in counts.to_pylist()]
+    histogram.sort(key=lambda row: [str(row[c]) for c in by] + [row['score'], row['bucket']])
+    return groups, histogram
+
+def _print_rows(rows):
+    if not rows:
+        print("(no rows)")
+        return
+    columns = list(rows[0])
+    cells = [[("" if row[c] is None else f"{row[c]:.1f}" if isinstance(row[c], float) else str(row[c]))[:40]
+              for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export stored runs to Parquet/Arrow and summarize scores")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Write every stored run to a .parquet or .arrow file")
+    export.add_argument("path")
+    report = commands.add_parser("summary", help="Score averages and distributions from an export")
+    report.add_argument("path")
+    report.add_argument("--by", default="model", help="Comma-separated group columns, e.g. model,role")
+    report.add_argument("--histogram", action="store_true", help="Also print score buckets per group")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    if args.command == "export":
+        count = export_runs(args.path)
+        print(f"Exported {count} runs to {args.path} ({os.path.getsize(args.path) / 2**20:.1f} MB) "
+              f"in {time.monotonic() - started:.1f}s", file=sys.stderr)
+        return 0
+    groups, histogram = summary(args.path, [column.strip() for column in args.by.split(",") if column.strip()])
+    _print_rows(groups)
+    if args.histogram:
+        print()
+        _print_rows(histogram)
+    print(f"Summarized in {time.monotonic() - started:.2f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
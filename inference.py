@@ -0,0 +1,308 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from cache import RESPONSE_CACHE, cache_key
+from ratelimit import RateLimitCancelled, RateLimitTimeout, get_rate_limiter
+
+# Optional OpenAI-compatible endpoint (e.g. a dedicated Inference Endpoint)
+INFERENCE_ENDPOINT = os.environ.get("HF_INFERENCE_ENDPOINT") or None
+
+
+class ClientPool:
+    """InferenceClients for single requests over one pooled HTTP session.
+
+    Connections are pooled by huggingface_hub's process-wide session
+    (get_session()), which every client sends through, so they survive
+    Streamlit reruns and are shared by every session in the server process.
+    The client object itself takes microseconds to build, so each request
+    leases its own and closes it afterwards. Closing releases the responses
+    the client keeps in its exit stack, and no client is ever closed while
+    another thread is still streaming through it.
+    """
+    def __init__(self):
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, api_token, endpoint=None, timeout=None):
+        client = self._create(api_token, endpoint, timeout)
+        with self._lock:
+            self._active += 1
+        try:
+            yield client
+        finally:
+            self._close(client)
+            with self._lock:
+                self._active -= 1
+
+    def __len__(self):
+        """Clients currently in use"""
+        return self._active
+
+    def _create(self, api_token, endpoint, timeout=None):
+        # Deferred so importing this module (e.g. on every Streamlit rerun) stays cheap
+        from huggingface_hub import InferenceClient
+        if endpoint:
+            return InferenceClient(base_url=endpoint, token=api_token, timeout=timeout)
+        return InferenceClient(token=api_token, timeout=timeout)
+
+    @staticmethod
+    def _close(client):
+        close = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+CLIENT_POOL = ClientPool()
+
+TEMPERATURE = 0.7
+
+# Retry policy for 429/503/timeouts
+MAX_RETRIES = int(os.environ.get("HF_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+class InferenceError(Exception):
+    """Base class for inference failures; str(e) is the user-facing message"""
+    retryable = False
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AuthenticationError(InferenceError):
+    pass
+
+class ModelNotFoundError(InferenceError):
+    pass
+
+class ModelLoadingError(InferenceError):
+    retryable = True
+
+class RateLimitError(InferenceError):
+    retryable = True
+
+class InferenceTimeout(InferenceError):
+    retryable = True
+
+class EmptyResponseError(InferenceError):
+    retryable = True
+
+class DeadlineExceeded(InferenceError):
+    pass
+
+class Cancelled(InferenceError):
+    pass
+
+class CancelToken(threading.Event):
+    """Cancellation flag for a run, with child() tokens for its individual requests.
+
+    Setting a token sets every child derived from it, so stopping a run also
+    stops e.g. both requests of a hedged race, while a child can be set on
+    its own without stopping the run.
+    """
+    def __init__(self):
+        super().__init__()
+        self._children = []
+        self._children_lock = threading.Lock()
+
+    def child(self):
+        token = CancelToken()
+        with self._children_lock:
+            self._children.append(token)
+        if self.is_set():
+            token.set()
+        return token
+
+    def set(self):
+        super().set()
+        with self._children_lock:
+            children = list(self._children)
+        for token in children:
+            token.set()
+
+def request_timeout(deadline):
+    """HTTP timeout in seconds for a request that must finish by `deadline` (None: client default).
+
+    The time left until the deadline, so a hung connection fails in time
+    to report the deadline rather than outliving the run. It is set on the
+    request's own leased client (see ClientPool), never on a shared one.
+    """
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("⏱️ Run deadline exceeded. Try again in a minute.")
+    return remaining
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def classify_error(e):
+    """Map a client exception onto the InferenceError hierarchy"""
+    if isinstance(e, InferenceError):
+        return e
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = parse_retry_after(headers.get("Retry-After"))
+    error_msg = str(e).lower()
+    if status == 401 or "401" in error_msg or "unauthorized" in error_msg:
+        return AuthenticationError("❌ Invalid API token. Check your token in the sidebar.")
+    elif status == 404 or "404" in error_msg or "not found" in error_msg:
+        return ModelNotFoundError("❌ Model not found or unavailable.")
+    elif status == 503 or "503" in error_msg or "loading" in error_msg:
+        return ModelLoadingError("🔄 Model is loading. Wait 20-30 seconds and try again.", retry_after)
+    elif status == 429 or "429" in error_msg or "rate limit" in error_msg:
+        return RateLimitError("⏱️ Rate limit exceeded. Wait a minute or upgrade to HF Pro.", retry_after)
+    elif isinstance(e, TimeoutError) or "timeout" in error_msg or "timed out" in error_msg:
+        return InferenceTimeout("⏱️ Request timeout. Try again or use a smaller model.")
+    else:
+        return InferenceError(f"❌ Error: {str(e)[:200]}")
+
+def estimate_tokens(prompt, max_length):
+    """Rough token cost of a request for the tokens-per-minute budget"""
+    return len(prompt) // 4 + max_length
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+def stream_completion(client, model, prompt, max_length=500):
+    """Yield completion text incrementally as the model produces it"""
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_length,
+        temperature=TEMPERATURE,
+        stream=True
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+def _complete(client, model, prompt, max_length, on_token):
+    if on_token:
+        parts = []
+        for delta in stream_completion(client, model, prompt, max_length):
+            parts.append(delta)
+            on_token(delta)
+        return "".join(parts)
+    completion = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_length,
+        temperature=TEMPERATURE
+    )
+    return completion.choices[0].message.content
+
+def hf_generate(api_token, model, prompt, max_length=500, endpoint=None,
+                use_cache=True, on_token=None, deadline=None, max_retries=MAX_RETRIES, span=None,
+                cancel=None):
+    """Hugging Face completion through the shared rate limiter, raising InferenceError.
+
+    Every request first takes capacity from the per-token RateLimiter.
+    429/503/timeouts are retried with jittered exponential backoff that
+    honors Retry-After, until `max_retries` or the `deadline`
+    (time.monotonic() value) runs out; the HTTP timeout of each attempt is
+    cut to fit the deadline too (request_timeout). With `on_token`, the completion is
+    streamed and each text delta is passed to the callback as it arrives;
+    a stream that already produced output is not retried. Successful
+    completions are stored in RESPONSE_CACHE. `endpoint` defaults to
+    INFERENCE_ENDPOINT as set at call time.
+
+    If `span` is a dict (see metrics.new_span) it receives the rate-limit
+    queue wait, request latency, time to first token, retry count and
+    whether the cache answered.
+
+    Setting the `cancel` event (threading.Event) stops the call at its next
+    token, retry, backoff or rate-limit wait with Cancelled. A non-streamed
+    request already in flight still runs to completion (and is cached),
+    bounded by its HTTP timeout.
+    """
+    endpoint = endpoint or INFERENCE_ENDPOINT
+    span = span if span is not None else {}
+    key = cache_key(model, prompt, max_length, TEMPERATURE)
+    if use_cache:
+        cached = RESPONSE_CACHE.get(key)
+        if cached is not None:
+            span['cache_hit'] = True
+            if on_token:
+                on_token(cached)
+            return cached
+    
+    limiter = get_rate_limiter(api_token)
+    emitted = []
+    def track(delta):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled("⏹️ Request cancelled.")
+        if not emitted:
+            span['ttft'] = time.monotonic() - request_started
+        emitted.append(delta)
+        on_token(delta)
+    
+    attempt = 0
+    while True:
+        try:
+            if cancel is not None and cancel.is_set():
+                raise Cancelled("⏹️ Request cancelled.")
+            span['queue_wait'] = span.get('queue_wait', 0.0) + limiter.acquire(
+                estimate_tokens(prompt, max_length), deadline, cancel)
+            timeout = request_timeout(deadline)
+            request_started = time.monotonic()
+            try:
+                with CLIENT_POOL.lease(api_token, endpoint, timeout) as client:
+                    response = _complete(client, model, prompt, max_length, track if on_token else None)
+            finally:
+                span['request_latency'] = span.get('request_latency', 0.0) + time.monotonic() - request_started
+            if not on_token:
+                span['ttft'] = time.monotonic() - request_started
+            if not response:
+                raise EmptyResponseError("⚠️ Model returned empty response. Try again.")
+            break
+        except RateLimitTimeout as e:
+            raise DeadlineExceeded(f"⏱️ {e}. Try again in a minute.")
+        except RateLimitCancelled:
+            raise Cancelled("⏹️ Request cancelled.")
+        except Exception as e:
+            error = classify_error(e)
+            if isinstance(error, InferenceTimeout) and deadline is not None and time.monotonic() >= deadline:
+                # The HTTP timeout was cut to the deadline (request_timeout), so this is the run running out
+                raise DeadlineExceeded("⏱️ Run deadline exceeded. Try again in a minute.")
+            if not error.retryable or emitted or attempt >= max_retries:
+                raise error
+            if isinstance(error, RateLimitError) and error.retry_after:
+                limiter.pause(error.retry_after)
+            delay = backoff_delay(attempt, error.retry_after)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise error
+            if cancel is not None:
+                if cancel.wait(delay):
+                    raise Cancelled("⏹️ Request cancelled.")
+            else:
+                time.sleep(delay)
+            attempt += 1
+            span['retries'] = attempt
+    
+    if use_cache:
+        RESPONSE_CACHE.put(key, response)
+    return response
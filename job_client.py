@@ -0,0 +1,90 @@
+import os
+from jobs import JobQueueFull, get_job_queue, job_state
+
+# Submit runs to a separate API process (see api.py) instead of this process's JobQueue
+API_URL = os.environ.get("LINKEDIN_API_URL") or None
+REQUEST_TIMEOUT_SECONDS = 10
+
+def _auth(api_token):
+    # Local models run without a token; send no header rather than "Bearer None"
+    return {'Authorization': f"Bearer {api_token}"} if api_token else {}
+
+class LocalJobClient:
+    """Runs jobs on this process's JobQueue"""
+    def submit(self, profile, api_token, model, **options):
+        return get_job_queue().submit(profile, api_token, model, **options).to_dict()
+
+    def resume(self, job_id, api_token, **options):
+        return get_job_queue().resume(job_id, api_token, **options).to_dict()
+
+    def cancel(self, job_id):
+        """Stop a job; returns its state, or None for unknown jobs"""
+        job = get_job_queue().cancel(job_id)
+        return job.to_dict() if job is not None else None
+
+    def status(self, job_id):
+        return job_state(job_id)
+
+    def events(self, job_id, since=0, wait=0.5):
+        """(events after `since`, job status); status is None for unknown jobs"""
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return [], None
+        events = job.wait_events(since, wait)
+        return events, job.status
+
+class RemoteJobClient:
+    """Runs jobs on the HTTP API at `base_url`"""
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def submit(self, profile, api_token, model, roles=None, **options):
+        if roles:
+            options['target_roles'] = roles
+        response = self.session.post(f"{self.base_url}/jobs", json={'profile': profile, 'model': model, **options},
+                                     headers=_auth(api_token),
+                                     timeout=REQUEST_TIMEOUT_SECONDS)
+        if response.status_code == 429:
+            raise JobQueueFull(response.json().get('detail', "Job queue is full"))
+        response.raise_for_status()
+        return response.json()
+
+    def resume(self, job_id, api_token, **options):
+        response = self.session.post(f"{self.base_url}/jobs/{job_id}/resume", json=options,
+                                     headers=_auth(api_token),
+                                     timeout=REQUEST_TIMEOUT_SECONDS)
+        if response.status_code == 429:
+            raise JobQueueFull(response.json().get('detail', "Job queue is full"))
+        if response.status_code == 404:
+            raise KeyError(job_id)
+        response.raise_for_status()
+        return response.json()
+
+    def cancel(self, job_id):
+        response = self.session.post(f"{self.base_url}/jobs/{job_id}/cancel", timeout=REQUEST_TIMEOUT_SECONDS)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def status(self, job_id):
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}", timeout=REQUEST_TIMEOUT_SECONDS)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def events(self, job_id, since=0, wait=0.5):
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}/events",
+                                    params={'since': since, 'wait': wait},
+                                    timeout=REQUEST_TIMEOUT_SECONDS + wait)
+        if response.status_code == 404:
+            return [], None
+        response.raise_for_status()
+        data = response.json()
+        return data['events'], data['status']
+
+def get_job_client():
+    return RemoteJobClient(API_URL) if API_URL else LocalJobClient()
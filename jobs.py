@@ -0,0 +1,383 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from agents import RUN_DEADLINE_SECONDS, STOPPED_MESSAGE, run_fanout, run_pipeline, unique_roles
+from inference import CancelToken
+from output_schema import result_scores
+from storage import get_store
+
+# Job queue limits (override for API deployments)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "32"))
+# Finished jobs kept in memory for polling; older ones are served from the store
+MAX_FINISHED_JOBS = 200
+
+class JobQueueFull(Exception):
+    pass
+
+class Job:
+    """One pipeline run submitted to the JobQueue.
+
+    Progress is kept as an append-only event list so any number of clients
+    can follow a run, and reattach after a disconnect, by asking for the
+    events after the last index they saw.
+
+    With several `roles` the job is a fan-out run (see run_fanout): its
+    results, timings and events are per role, and each role's run is
+    saved as '<job id>_<index>'.
+
+    stop() cancels the job: a queued job never starts and a running one
+    stops between agents or at its next token, retry or rate-limit wait.
+    With `heartbeat_seconds`, a job nobody has asked for events for that
+    long is stopped as abandoned.
+    """
+    def __init__(self, profile, api_token, model, use_cache=True, hedge=False, incremental=True,
+                 job_id=None, resume=False, similar_threshold=None, roles=None, session_id=None,
+                 deadline_seconds=RUN_DEADLINE_SECONDS, heartbeat_seconds=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.profile = dict(profile)
+        self.api_token = api_token
+        self.model = model
+        self.use_cache = use_cache
+        self.hedge = hedge
+        self.incremental = incremental
+        # Borrow Agent 1/2 results from a stored run this similar (see run_pipeline)
+        self.similar_threshold = similar_threshold
+        # Continue from the checkpoints of an earlier attempt with the same id
+        self.resume = resume
+        self.roles = unique_roles(roles or [])
+        if len(self.roles) < 2:
+            if self.roles:
+                self.profile['target_role'] = self.roles[0]
+            self.roles = []
+        self.role_errors = {}
+        # Submissions from the same session are coalesced (see JobQueue.submit)
+        self.session_id = session_id
+        self.deadline_seconds = deadline_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.cancel = CancelToken()
+        self.stop_reason = None
+        self.seen_at = time.monotonic()
+        self.status = 'queued'
+        self.results = {}
+        self.error = None
+        self.timings = {}
+        self.logs = []
+        self.reused = []
+        self.events = []
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def same_request(self, other):
+        return (self.profile, self.model, self.roles) == (other.profile, other.model, other.roles)
+
+    def _emit(self, event):
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def on_token(self, key, delta):
+        self._emit({'type': 'token', 'agent': key, 'text': delta})
+
+    def on_result(self, key, result):
+        self.results[key] = result
+        self._emit({'type': 'result', 'agent': key, 'text': result})
+
+    def on_role_token(self, role, key, delta):
+        self._emit({'type': 'token', 'role': role, 'agent': key, 'text': delta})
+
+    def on_role_result(self, role, key, result):
+        self.results.setdefault(role, {})[key] = result
+        self._emit({'type': 'result', 'role': role, 'agent': key, 'text': result})
+
+    def run_ids(self):
+        """{role: stored run id} of a fan-out job"""
+        return {role: f"{self.id}_{index}" for index, role in enumerate(self.roles)}
+
+    def start(self):
+        """Mark the job running; False if it was stopped while queued"""
+        with self._changed:
+            if self.finished:
+                return False
+            self.status = 'running'
+            self.started_at = datetime.now().isoformat()
+            self._emit({'type': 'status', 'status': self.status})
+            return True
+
+    def finish(self, results, error):
+        self.results = dict(results)
+        with self._changed:
+            if error and self.cancel.is_set():
+                self.status, self.error = 'cancelled', self.stop_reason
+            else:
+                self.status, self.error = ('failed' if error else 'done'), error
+            self.finished_at = datetime.now().isoformat()
+            self._emit({'type': 'status', 'status': self.status, 'error': self.error})
+
+    def stop(self, reason=STOPPED_MESSAGE):
+        """Cancel the job; one still queued is finished right away"""
+        with self._changed:
+            if self.finished:
+                return
+            if self.stop_reason is None:
+                self.stop_reason = reason
+            self.cancel.set()
+            if self.status == 'queued':
+                self.status, self.error = 'cancelled', self.stop_reason
+                self.finished_at = datetime.now().isoformat()
+                self._emit({'type': 'status', 'status': self.status, 'error': self.error})
+
+    def check_heartbeat(self):
+        """Stop the job if its followers have been gone for heartbeat_seconds"""
+        if self.heartbeat_seconds and time.monotonic() - self.seen_at > self.heartbeat_seconds:
+            self.stop(f"⏹️ Run stopped: nobody followed it for {self.heartbeat_seconds:.0f}s.")
+
+    def wait_events(self, since=0, timeout=None):
+        """Events after index `since`, waiting up to `timeout` seconds for new ones"""
+        self.seen_at = time.monotonic()
+        with self._changed:
+            if len(self.events) <= since and not self.finished and timeout:
+                self._changed.wait(timeout)
+            return self.events[since:]
+
+    def to_dict(self):
+        """Public job state; never includes the API token.
+
+        For a fan-out job 'results' is empty and 'role_runs' holds, per
+        role, the stored run id, results, scores and error.
+        """
+        if self.roles:
+            role_runs = {role: {'run_id': run_id,
+                                'results': dict(self.results.get(role, {})),
+                                'scores': result_scores(self.results.get(role, {})),
+                                'error': self.role_errors.get(role)}
+                         for role, run_id in self.run_ids().items()}
+            results = {}
+        else:
+            role_runs, results = {}, dict(self.results)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'model': self.model,
+            'target_role': self.profile.get('target_role'),
+            'roles': list(self.roles),
+            'profile': self.profile,
+            'results': results,
+            'scores': result_scores(results),
+            'role_runs': role_runs,
+            'error': self.error,
+            'stop_requested': self.cancel.is_set(),
+            'timings': dict(self.timings),
+            'reused': list(self.reused),
+            'logs': list(self.logs),
+            'events': len(self.events),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+class JobQueue:
+    """Bounded in-process queue of pipeline runs served by a fixed pool of workers.
+
+    Submissions beyond `max_queued` waiting jobs are rejected with
+    JobQueueFull instead of piling up. The job id doubles as the pipeline
+    run id, so agent results are checkpointed under it and a failed job can
+    be resumed. Completed runs are saved to the results store under it too.
+
+    A session has at most one unfinished job: resubmitting the same request
+    returns the job already under way, and a different request stops it.
+    """
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, profile, api_token, model, **options):
+        job = Job(profile, api_token, model, **options)
+        with self._lock:
+            current = self._sessions.get(job.session_id) if job.session_id else None
+            if current is not None and not current.finished and current.same_request(job):
+                return current
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFull(f"Job queue is full ({self._queue.maxsize} waiting); try again shortly")
+            if current is not None:
+                current.stop("⏹️ Run replaced by a newer one from the same session.")
+            if job.session_id:
+                self._sessions[job.session_id] = job
+            self._jobs[job.id] = job
+            self._jobs.move_to_end(job.id)
+            self._trim()
+        return job
+
+    def cancel(self, job_id):
+        """Stop a queued or running job; returns it, or None if it is not in memory"""
+        job = self.get(job_id)
+        if job is not None:
+            job.stop()
+        return job
+
+    def resume(self, job_id, api_token, **options):
+        """Resubmit a failed job under the same id, skipping its checkpointed agents"""
+        previous = self.get(job_id)
+        if previous is not None and not previous.finished:
+            raise ValueError(f"Job {job_id} is still {previous.status}")
+        inputs = get_store().get_checkpoint_run(job_id)
+        if inputs is None:
+            raise KeyError(f"No resumable run {job_id}")
+        return self.submit(inputs['profile'], api_token, inputs['model'], job_id=job_id, resume=True, **options)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {'workers': self.workers, 'queued': self._queue.qsize(),
+                'max_queued': self._queue.maxsize, 'jobs': counts}
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+        for session_id, job in list(self._sessions.items()):
+            if job.finished:
+                del self._sessions[session_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            # A job abandoned while it waited in the queue is stopped before it costs any requests
+            job.check_heartbeat()
+            if not job.start():
+                continue
+            if job.roles:
+                self._work_fanout(job)
+                continue
+            try:
+                results, error = run_pipeline(job.profile, job.api_token, job.model, job.logs,
+                                              job.use_cache, job.on_token, job.on_result,
+                                              poll=job.check_heartbeat, deadline_seconds=job.deadline_seconds,
+                                              timings=job.timings, run_id=job.id, hedge=job.hedge,
+                                              incremental=job.incremental, reused=job.reused,
+                                              resume=job.resume, similar_threshold=job.similar_threshold,
+                                              cancel=job.cancel)
+                if not error:
+                    get_store().save_run(job.profile, results, model=job.model, timings=job.timings,
+                                         name=f"job_{job.id}", run_id=job.id)
+            except Exception as e:
+                results, error = job.results, f"❌ Error: {str(e)[:200]}"
+            job.finish(results, error)
+
+    def _work_fanout(self, job):
+        try:
+            results, errors = run_fanout(job.profile, job.roles, job.api_token, job.model, job.logs,
+                                         job.use_cache, job.on_role_token, job.on_role_result,
+                                         poll=job.check_heartbeat, deadline_seconds=job.deadline_seconds,
+                                         timings=job.timings, run_id=job.id, hedge=job.hedge,
+                                         incremental=job.incremental, cancel=job.cancel)
+            job.role_errors = {role: error for role, error in errors.items() if error}
+            for role, run_id in job.run_ids().items():
+                if not errors[role]:
+                    get_store().save_run({**job.profile, 'target_role': role}, results[role], model=job.model,
+                                         timings=job.timings.get(role), name=f"job_{job.id}", run_id=run_id)
+            error = "; ".join(f"{role}: {error}" for role, error in job.role_errors.items()) or None
+        except Exception as e:
+            results, error = job.results, f"❌ Error: {str(e)[:200]}"
+            job.role_errors = dict.fromkeys(job.roles, error)
+        job.finish(results, error)
+
+def _stored_state(job_id, **fields):
+    """Public state of a job rebuilt from the store; `fields` override the defaults"""
+    return {
+        'id': job_id,
+        'status': 'done',
+        'model': None,
+        'target_role': None,
+        'roles': [],
+        'profile': {},
+        'results': {},
+        'scores': {},
+        'role_runs': {},
+        'error': None,
+        'stop_requested': False,
+        'timings': {},
+        'reused': [],
+        'logs': [],
+        'events': 0,
+        'created_at': None,
+        'started_at': None,
+        'finished_at': None,
+        **fields,
+    }
+
+def job_state(job_id):
+    """Public state of a job, falling back to the stored run once it has left memory"""
+    job = get_job_queue().get(job_id)
+    if job is not None:
+        return job.to_dict()
+    store = get_store()
+    run = store.get_run(job_id)
+    if run is not None:
+        return _stored_state(run['id'], model=run['model'], target_role=run['target_role'],
+                             profile=run['profile'], results=run['results'], scores=run['scores'],
+                             timings=run['timings'] or {}, created_at=run['timestamp'])
+    unfinished = store.get_checkpoint_run(job_id)
+    if unfinished is not None:
+        completed = store.load_checkpoints(job_id)
+        return _stored_state(job_id, status='cancelled' if unfinished['error'] == STOPPED_MESSAGE else 'failed',
+                             model=unfinished['model'], target_role=unfinished['profile'].get('target_role'),
+                             profile=unfinished['profile'], results=completed, scores=result_scores(completed),
+                             error=unfinished['error'], finished_at=unfinished['updated_at'])
+    # A fan-out job stores one run per successful role as <job id>_<index> (Job.run_ids);
+    # found by id, since the UI saves them again under its own run name
+    prefix = f"{job_id}_"
+    runs = sorted((run for run in store.find_runs(id_prefix=prefix) if run['id'][len(prefix):].isdigit()),
+                  key=lambda run: int(run['id'][len(prefix):]))
+    if not runs:
+        return None
+    roles = [run['target_role'] for run in runs]
+    profile = {**runs[0]['profile'], 'target_role': roles[0]}
+    return _stored_state(job_id, model=runs[0]['model'], target_role=roles[0], roles=roles, profile=profile,
+                         role_runs={run['target_role']: {'run_id': run['id'], 'results': run['results'],
+                                                         'scores': run['scores'], 'error': None}
+                                    for run in runs},
+                         timings={run['target_role']: run['timings'] or {} for run in runs},
+                         created_at=runs[0]['timestamp'])
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Process-wide JobQueue, started on first use"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
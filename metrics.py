@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+# Histogram buckets (seconds) for request and run latency
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+RECENT_SPANS = 2000
+RECENT_LATENCIES_PER_MODEL = 200
+
+def new_span(run_id, agent, model, role=None):
+    """Span for one agent call; the inference backend fills in the request details.
+
+    `agent` is a metrics label and must come from a fixed set; free-form
+    tags such as a fan-out target role go in `role`, kept on the span only.
+    """
+    return {
+        'run_id': run_id,
+        'agent': agent,
+        'role': role,
+        'model': model,
+        'started_at': time.time(),
+        'queue_wait': 0.0,
+        'request_latency': 0.0,
+        'ttft': None,
+        'duration': None,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'retries': 0,
+        'cache_hit': False,
+        # 'primary' or 'backup' when the call was hedged across two models
+        'hedge': None,
+        'outcome': 'ok',
+    }
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class MetricsRegistry:
+    """Process-wide aggregation of agent spans and pipeline runs.
+
+    Keeps counters and latency histograms per (agent, model), the most
+    recent spans for per-run views, and a window of recent latencies per
+    model for percentile lookups.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = deque(maxlen=RECENT_SPANS)
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(Histogram)
+        self.queue_wait = defaultdict(float)
+        self.tokens = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.cache_hits = defaultdict(int)
+        self.hedges = defaultdict(int)
+        self.runs = defaultdict(int)
+        self.run_latency = Histogram()
+        self.model_latencies = defaultdict(lambda: deque(maxlen=RECENT_LATENCIES_PER_MODEL))
+        self.model_ttfts = defaultdict(lambda: deque(maxlen=RECENT_LATENCIES_PER_MODEL))
+
+    def record_span(self, span):
+        key = (span['agent'], span['model'])
+        with self._lock:
+            self.spans.append(span)
+            self.requests[key + (span['outcome'],)] += 1
+            self.queue_wait[key] += span['queue_wait']
+            self.tokens[key + ('prompt',)] += span['prompt_tokens']
+            self.tokens[key + ('completion',)] += span['completion_tokens']
+            self.retries[key] += span['retries']
+            if span['hedge'] == 'backup':
+                self.hedges[key] += 1
+            if span['cache_hit']:
+                self.cache_hits[key] += 1
+            elif span['outcome'] == 'ok':
+                self.latency[key].observe(span['request_latency'])
+                self.model_latencies[span['model']].append(span['request_latency'])
+                if span['ttft'] is not None:
+                    self.model_ttfts[span['model']].append(span['ttft'])
+
+    def record_run(self, outcome, seconds):
+        with self._lock:
+            self.runs[outcome] += 1
+            self.run_latency.observe(seconds)
+
+    def run_spans(self, run_id):
+        with self._lock:
+            return [span for span in self.spans if span['run_id'] == run_id]
+
+    def latency_quantile(self, model, q, min_samples=5, ttft=False):
+        """q-quantile of recent successful request latency (or time to first token) for `model`, or None"""
+        with self._lock:
+            window = self.model_ttfts if ttft else self.model_latencies
+            values = sorted(window.get(model, ()))
+        if len(values) < min_samples:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary(self):
+        """Per (agent, model) aggregates for display"""
+        with self._lock:
+            rows = []
+            for (agent, model), hist in sorted(self.latency.items()):
+                rows.append({
+                    'agent': agent,
+                    'model': model,
+                    'requests': sum(n for (a, m, _), n in self.requests.items() if (a, m) == (agent, model)),
+                    'mean_latency': round(hist.sum / hist.count, 3) if hist.count else None,
+                    'queue_wait': round(self.queue_wait[(agent, model)], 3),
+                    'prompt_tokens': self.tokens[(agent, model, 'prompt')],
+                    'completion_tokens': self.tokens[(agent, model, 'completion')],
+                    'retries': self.retries[(agent, model)],
+                    'cache_hits': self.cache_hits[(agent, model)],
+                    'hedges': self.hedges[(agent, model)],
+                })
+            return rows
+
+    def to_json(self):
+        with self._lock:
+            data = {
+                'requests': [{'agent': a, 'model': m, 'outcome': o, 'count': n}
+                             for (a, m, o), n in self.requests.items()],
+                'runs': dict(self.runs),
+                'run_latency': {'count': self.run_latency.count, 'sum': self.run_latency.sum},
+            }
+        data['agents'] = self.summary()
+        return json.dumps(data, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        def escape(value):
+            # Label values escape backslash, double quote and newline
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        def label(**labels):
+            return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+        def histogram(name, hist, **labels):
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append(f"{name}_bucket{label(**labels, le=bound)} {count}")
+            lines.append(f"{name}_bucket{label(**labels, le='+Inf')} {hist.count}")
+            lines.append(f"{name}_sum{label(**labels)} {hist.sum}")
+            lines.append(f"{name}_count{label(**labels)} {hist.count}")
+
+        with self._lock:
+            lines.append("# TYPE linkedin_agent_requests_total counter")
+            for (agent, model, outcome), n in sorted(self.requests.items()):
+                lines.append(f"linkedin_agent_requests_total{label(agent=agent, model=model, outcome=outcome)} {n}")
+            lines.append("# TYPE linkedin_agent_request_seconds histogram")
+            for (agent, model), hist in sorted(self.latency.items()):
+                histogram("linkedin_agent_request_seconds", hist, agent=agent, model=model)
+            lines.append("# TYPE linkedin_agent_queue_wait_seconds_total counter")
+            for (agent, model), seconds in sorted(self.queue_wait.items()):
+                lines.append(f"linkedin_agent_queue_wait_seconds_total{label(agent=agent, model=model)} {seconds}")
+            lines.append("# TYPE linkedin_agent_tokens_total counter")
+            for (agent, model, kind), n in sorted(self.tokens.items()):
+                lines.append(f"linkedin_agent_tokens_total{label(agent=agent, model=model, kind=kind)} {n}")
+            lines.append("# TYPE linkedin_agent_retries_total counter")
+            for (agent, model), n in sorted(self.retries.items()):
+                lines.append(f"linkedin_agent_retries_total{label(agent=agent, model=model)} {n}")
+            lines.append("# TYPE linkedin_agent_cache_hits_total counter")
+            for (agent, model), n in sorted(self.cache_hits.items()):
+                lines.append(f"linkedin_agent_cache_hits_total{label(agent=agent, model=model)} {n}")
+            lines.append("# TYPE linkedin_agent_hedges_total counter")
+            for (agent, model), n in sorted(self.hedges.items()):
+                lines.append(f"linkedin_agent_hedges_total{label(agent=agent, model=model)} {n}")
+            lines.append("# TYPE linkedin_runs_total counter")
+            for outcome, n in sorted(self.runs.items()):
+                lines.append(f"linkedin_runs_total{label(outcome=outcome)} {n}")
+            lines.append("# TYPE linkedin_run_seconds histogram")
+            histogram("linkedin_run_seconds", self.run_latency)
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
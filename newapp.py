@@ -1,9 +1,24 @@
 import streamlit as st
+import html
 import json
 import os
+import uuid
 from datetime import datetime
-import time
-from huggingface_hub import InferenceClient
+from config import DATA_DIR
+from cache import RESPONSE_CACHE
+from inference import InferenceError, ModelLoadingError
+from backends import LOCAL_MODEL, LOCAL_PREFIX, get_backend, is_local
+from agents import AGENT_LABELS, unique_roles
+from jobs import JobQueueFull
+from job_client import get_job_client
+from storage import get_store, save_data, load_data
+from similarity import SIMILARITY_THRESHOLD
+from output_schema import ANALYSIS_SCHEMA, REVIEW_SCHEMA, load_result, result_scores, to_markdown
+from sessions import clamp_logs, clamp_profile, get_session_manager
+from history_export import export_runs, summary
+from pdf_ingest import PDFTooLarge, parse_linkedin_pdf
+from ats import family_keywords, role_family, score_profile
+from metrics import METRICS
 
 # Page config
 st.set_page_config(
@@ -13,7 +28,7 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
+APP_CSS = """
 <style>
 .agent-box {
     padding: 20px;
@@ -32,216 +47,490 @@ st.markdown("""
     border-left: 4px solid #10b981;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(APP_CSS, unsafe_allow_html=True)
+
+MODEL_INFO = {
+    "Qwen/Qwen2.5-7B-Instruct": "⭐ Very fast & excellent",
+    "google/gemma-2-9b-it": "🎯 Excellent quality",
+    "meta-llama/Llama-3.2-3B-Instruct": "⚡ Fast & capable",
+    "mistralai/Mistral-7B-Instruct-v0.3": "🚀 Classic & reliable",
+    LOCAL_PREFIX + LOCAL_MODEL: "💻 Offline on this machine's CPU (needs transformers + torch, no token)",
+}
+
+# Only the most recent entries are rendered so reruns stay cheap on long sessions
+MAX_LOG_ENTRIES = 40
+# Stored runs at least this similar are pointed out before running
+SIMILAR_SHOW_THRESHOLD = 0.8
+# Extra target roles one run can be compared across (fan-out, see run_fanout)
+MAX_COMPARE_ROLES = 3
+# Runs whose progress nobody has polled for this long (tab closed) are stopped
+JOB_HEARTBEAT_SECONDS = 60
 
-# Initialize session state
+# Initialize session state. Results are not kept here: `results_run_id` is a
+# handle to a stored run, loaded through the process-wide SessionManager
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if 'profile_data' not in st.session_state:
     st.session_state.profile_data = {}
-if 'analysis_results' not in st.session_state:
-    st.session_state.analysis_results = {}
+if 'results_run_id' not in st.session_state:
+    st.session_state.results_run_id = None
 if 'agent_logs' not in st.session_state:
     st.session_state.agent_logs = []
+if 'compare_roles' not in st.session_state:
+    st.session_state.compare_roles = []
+# {role: run id} of the last fan-out run, shown side by side in the Results tab
+if 'compare_run_ids' not in st.session_state:
+    st.session_state.compare_run_ids = {}
+get_session_manager().touch(st.session_state.session_id)
 
-# Data directory
-DATA_DIR = "linkedin_data"
-os.makedirs(DATA_DIR, exist_ok=True)
+def show_results(run_id, results=None):
+    """Make `run_id` the run shown in the Results tab; pass `results` when already in hand"""
+    st.session_state.results_run_id = run_id
+    if results is not None:
+        get_session_manager().put(st.session_state.session_id, run_id, results)
 
-def hf_api_call(api_token, model, prompt, max_length=500):
-    """Hugging Face API call using InferenceClient"""
-    try:
-        client = InferenceClient(token=api_token)
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_length,
-            temperature=0.7
-        )
-        response = completion.choices[0].message.content
-        return response if response else "⚠️ Model returned empty response. Try again."
-    except Exception as e:
-        error_msg = str(e).lower()
-        if "401" in error_msg or "unauthorized" in error_msg:
-            return "❌ Invalid API token. Check your token in the sidebar."
-        elif "404" in error_msg or "not found" in error_msg:
-            return f"❌ Model not found or unavailable."
-        elif "503" in error_msg or "loading" in error_msg:
-            return "🔄 Model is loading. Wait 20-30 seconds and try again."
-        elif "429" in error_msg or "rate limit" in error_msg:
-            return "⏱️ Rate limit exceeded. Wait a minute or upgrade to HF Pro."
-        elif "timeout" in error_msg:
-            return "⏱️ Request timeout. Try again or use a smaller model."
-        else:
-            return f"❌ Error: {str(e)[:200]}"
+def current_results():
+    run_id = st.session_state.results_run_id
+    if not run_id:
+        return {}
+    return get_session_manager().results(st.session_state.session_id, run_id)
 
-class LinkedInAgent:
-    """Base agent class"""
-    def __init__(self, name, role, api_token, model):
-        self.name = name
-        self.role = role
-        self.api_token = api_token
-        self.model = model
-    
-    def log_activity(self, message):
-        st.session_state.agent_logs.append({
-            "agent": self.name,
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-            "message": message
-        })
-    
-    def generate(self, prompt, max_length=500):
-        return hf_api_call(self.api_token, self.model, prompt, max_length)
+def show_job_results(state):
+    """Show a finished job; a fan-out job opens its first role and fills the role comparison"""
+    if not state['roles']:
+        st.session_state.compare_run_ids = {}
+        show_results(state['id'], state['results'])
+        return
+    runs = {role: run for role, run in state['role_runs'].items() if not run['error']}
+    st.session_state.compare_run_ids = {role: run['run_id'] for role, run in runs.items()}
+    for role, run in runs.items():
+        get_session_manager().put(st.session_state.session_id, run['run_id'], run['results'], slot=role)
+    first = next(iter(runs.values()))
+    show_results(first['run_id'], first['results'])
 
-class Agent1_Analyzer(LinkedInAgent):
-    def execute(self, profile_data, context=None):
-        self.log_activity("🔍 Starting comprehensive analysis...")
-        prompt = f"""You are a LinkedIn Profile Analyzer for remote jobs. Analyze this profile:
+def test_hf_connection(api_token, model):
+    return get_backend(model, api_token).generate(model, "Hello! Tell me a very short joke.", max_length=50,
+                                                  use_cache=False, max_retries=0)
 
-TARGET ROLE: {profile_data.get('target_role', 'Remote position')}
-HEADLINE: {profile_data.get('headline', 'Not provided')}
-ABOUT: {profile_data.get('about', 'Not provided')[:500]}
-EXPERIENCE: {profile_data.get('experience', 'Not provided')[:500]}
-SKILLS: {profile_data.get('skills', 'Not provided')}
+def run_multi_agent_system(profile_data, api_token, model, use_cache=True, stream=True, hedge=False,
+                           incremental=True, resume_id=None, reuse_similar=False, roles=None):
+    """Submit a run (or resume the failed run `resume_id`) and follow it.
 
-Provide analysis with:
-1. Remote-Readiness Score (0-100)
-2. Top 3 Strengths
-3. Top 3 Critical Gaps
-4. 5 Missing Keywords for ATS
-5. Top 3 Priority Improvements"""
-        
-        response = self.generate(prompt, max_length=600)
-        self.log_activity("✅ Analysis complete")
-        return response
+    With several `roles` the profile is optimized for each of them in one
+    fan-out run that shares Agent 1's analysis.
+    Returns the finished job state, or None if the run failed.
+    """
+    client = get_job_client()
+    # One run per session: re-clicking joins the run under way, changed inputs replace it
+    options = dict(use_cache=use_cache, hedge=hedge, incremental=incremental,
+                   session_id=st.session_state.session_id, heartbeat_seconds=JOB_HEARTBEAT_SECONDS)
+    try:
+        if resume_id:
+            job = client.resume(resume_id, api_token, **options)
+        else:
+            if roles and len(roles) > 1:
+                options['roles'] = roles
+            job = client.submit(profile_data, api_token, model,
+                                similar_threshold=SIMILARITY_THRESHOLD if reuse_similar else None, **options)
+    except KeyError:
+        st.warning("⚠️ There is nothing left to resume for that run.")
+        st.session_state.failed_run = None
+        return None
+    except JobQueueFull as e:
+        st.warning(f"⏳ {e}")
+        return None
+    except Exception as e:
+        st.error(f"Error in multi-agent system: {e}")
+        return None
+    # Kept in the URL so a browser refresh reattaches to the run instead of losing it
+    st.query_params['job'] = job['id']
+    return follow_job(job['id'], stream)
 
-class Agent2_ReAnalyzer(LinkedInAgent):
-    def execute(self, profile_data, context=None):
-        self.log_activity("🔄 Re-analyzing and validating...")
-        agent1_result = context.get('agent1_result', '')[:800]
-        prompt = f"""You are a Critical Reviewer. Review this LinkedIn analysis:
+def stop_job(job_id):
+    get_job_client().cancel(job_id)
 
-ANALYSIS:
-{agent1_result}
+def follow_job(job_id, stream=True):
+    """Render a job's progress until it finishes; returns its final state, or None if it failed.
 
-PROFILE TARGET: {profile_data.get('target_role')}
+    `following` stays set while this runs, so a rerun that interrupts it
+    (any widget click) picks the job back up instead of losing it.
+    """
+    client = get_job_client()
+    st.session_state.last_run_id = job_id
+    st.session_state.following = job_id
+    initial = client.status(job_id)
+    # Events of a fan-out job carry their role; a single run's are keyed by role None
+    roles = (initial or {}).get('roles') or [None]
+    
+    progress = st.progress(0)
+    status = st.empty()
+    status.markdown("### 🤖 Agents 1 & 3 working in parallel...")
+    # Runs as a callback at the start of the rerun the click triggers, before anything else
+    st.button("⏹️ Stop Run", key=f"stop_{job_id}", on_click=stop_job, args=(job_id,),
+              use_container_width=True)
+    
+    streamed = {(role, key): "" for role in roles for key in AGENT_LABELS}
+    live_boxes = {}
+    if stream:
+        st.subheader("📡 Live Output")
+        for role in roles:
+            for key, label in AGENT_LABELS.items():
+                title = f"{label} · {role}" if role else label
+                with st.expander(title, expanded=(key == 'agent3' and role == roles[0])):
+                    live_boxes[(role, key)] = st.empty()
+    
+    done = []
+    since = 0
+    finished = False
+    try:
+        while True:
+            events, job_status = client.events(job_id, since)
+            since += len(events)
+            changed = set()
+            for event in events:
+                box = (event.get('role'), event.get('agent'))
+                if event['type'] == 'token':
+                    streamed[box] += event['text']
+                    changed.add(box)
+                elif event['type'] == 'result':
+                    changed.discard(box)
+                    if stream:
+                        live_boxes[box].markdown(event['text'])
+                    done.append(box)
+                    progress.progress(min(100, 100 * len(done) // (4 * len(roles))))
+                    status.markdown(f"### ✅ {AGENT_LABELS[box[1]]} complete" + (f" for {box[0]}" if box[0] else ""))
+            if stream:
+                for box in changed:
+                    live_boxes[box].markdown(streamed[box] + "▌")
+            if finished:
+                break
+            if job_status == 'queued':
+                status.markdown("### ⏳ Queued, waiting for a free worker...")
+            elif job_status != 'running':
+                # The status is read after the events, so poll once more for any emitted in between
+                finished = True
+        state = client.status(job_id)
+    except Exception as e:
+        st.session_state.following = None
+        st.error(f"Error in multi-agent system: {e}")
+        return None
+    st.session_state.following = None
+    
+    if state is None:
+        st.warning("⚠️ This run is no longer available.")
+        return None
+    st.session_state.agent_logs = clamp_logs(state['logs'])
+    st.session_state.run_timings = state['timings']
+    st.session_state.reused_agents = state['reused']
+    if state['status'] == 'cancelled':
+        status.markdown("### ⏹️ Run stopped")
+    if state['error'] and state['roles']:
+        # Fan-out runs are not checkpointed; keep whichever roles did finish
+        st.warning(state['error'])
+        st.session_state.failed_run = None
+        if all(run['error'] for run in state['role_runs'].values()):
+            return None
+    elif state['error']:
+        st.warning(state['error'])
+        # Completed agents are checkpointed under the job id, so the run can pick up from here
+        st.session_state.failed_run = {'id': job_id, 'completed': len(state['results'])}
+        return None
+    st.session_state.failed_run = None
+    
+    status.markdown("### ✅ Multi-agent analysis complete!")
+    if state['reused']:
+        st.info("♻️ Reused stored output (unchanged inputs or a near-identical profile) for: " +
+                ", ".join(AGENT_LABELS[key] for key in sorted(state['reused'])))
+    return state
 
-Provide:
-1. Do you agree with the assessment? Why or why not?
-2. 2 Overlooked opportunities
-3. 2 Alternative improvement approaches
-4. Market insight for this role"""
-        
-        response = self.generate(prompt, max_length=500)
-        self.log_activity("✅ Re-analysis complete")
-        return response
+def save_run_results(state):
+    """Store a finished run under its job id (saving the same job twice keeps one row).
 
-class Agent3_Rewriter(LinkedInAgent):
-    def execute(self, profile_data, context=None):
-        self.log_activity("✍️ Rewriting profile for remote roles...")
-        prompt = f"""You are a LinkedIn Profile Writer. Create an optimized profile for: {profile_data.get('target_role')}
+    Each finished role of a fan-out job is stored as its own run.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if state['roles']:
+        for role, run in state['role_runs'].items():
+            if not run['error']:
+                get_store().save_run({**state['profile'], 'target_role': role}, run['results'],
+                                     model=state['model'], timings=state['timings'].get(role),
+                                     name=f'results_{timestamp}.json', run_id=run['run_id'])
+    else:
+        get_store().save_run(state['profile'], state['results'], model=state['model'],
+                             timings=state['timings'], name=f'results_{timestamp}.json', run_id=state['id'])
+    recent_runs.clear()
+    role_scores.clear()
+    stored_run_count.clear()
+    closest_run.clear()
 
-CURRENT HEADLINE: {profile_data.get('headline', 'Not provided')}
-CURRENT ABOUT: {profile_data.get('about', 'Not provided')[:400]}
+# Cached lookups are shared by all sessions; max_entries keeps them bounded too
+@st.cache_data(ttl=30, max_entries=100, show_spinner=False)
+def recent_runs(target_role, limit=10):
+    return get_store().find_runs(target_role=target_role, limit=limit)
 
-Create:
-1. NEW HEADLINE (120 chars max, keyword-rich, remote-focused)
-2. NEW ABOUT SECTION (2-3 short paragraphs, highlight remote skills)
-3. 5 OPTIMIZED EXPERIENCE BULLETS (start with action verbs)
-4. TOP 15 SKILLS (ATS-optimized, include relevant technologies)"""
-        
-        response = self.generate(prompt, max_length=800)
-        self.log_activity("✅ Profile rewrite complete")
-        return response
+@st.cache_data(ttl=30, max_entries=100, show_spinner=False)
+def role_scores(target_role):
+    return get_store().score_summary(target_role=target_role)
 
-class Agent4_Reviewer(LinkedInAgent):
-    def execute(self, profile_data, context=None):
-        self.log_activity("🔎 Final quality review...")
-        rewritten = context.get('agent3_result', '')[:800]
-        prompt = f"""You are a Quality Reviewer. Review this optimized LinkedIn profile:
+@st.cache_data(ttl=30, max_entries=100, show_spinner=False)
+def closest_run(profile_json):
+    """(similarity, run) of the most similar stored profile for the same role, or None"""
+    matches = get_store().find_similar_runs(json.loads(profile_json), SIMILAR_SHOW_THRESHOLD, limit=1)
+    return matches[0] if matches else None
 
-{rewritten}
+@st.cache_data(ttl=30, show_spinner=False)
+def stored_run_count():
+    return get_store().count_runs()
 
-TARGET: {profile_data.get('target_role')}
+def reattach(job_id):
+    state = follow_job(job_id)
+    if state:
+        if not st.session_state.profile_data:
+            st.session_state.profile_data = clamp_profile(state['profile'])
+        save_run_results(state)
+        show_job_results(state)
 
-Provide:
-1. Quality Score (0-100)
-2. Top 3 Strengths
-3. 2 Remaining Issues
-4. ATS Compatibility Score (0-100)
-5. Final Recommendation"""
-        
-        response = self.generate(prompt, max_length=500)
-        self.log_activity("✅ Review complete")
-        return response
+def render_analysis_tab(api_token, model):
+    st.header("🤖 Multi-Agent Analysis")
+    
+    # A run submitted before a browser refresh keeps going on the job queue; pick it back up
+    job_id = st.query_params.get('job')
+    if job_id and job_id != st.session_state.get('last_run_id'):
+        st.info("🔄 Reattaching to your previous run...")
+        reattach(job_id)
+    
+    if not api_token and not is_local(model):
+        st.error("⚠️ Enter your Hugging Face token in the sidebar!")
+        return
+    
+    if not st.session_state.profile_data:
+        st.warning("⚠️ Enter your profile in the 'Input Profile' tab first!")
+        return
+    
+    if not st.session_state.profile_data.get('target_role'):
+        st.error("⚠️ Specify your target role!")
+        return
+    
+    roles = unique_roles([st.session_state.profile_data['target_role']] + st.session_state.compare_roles)
+    st.info(f"🎯 Optimizing for: **{'**, **'.join(roles)}**")
+    st.caption(f"🤖 Using: {model}")
+    if len(roles) > 1:
+        st.caption(f"🧭 One Agent 1 analysis is shared by all {len(roles)} roles and the rest run side by side: "
+                   f"{1 + 3 * len(roles)} model calls instead of {4 * len(roles)}")
+    
+    ats = score_profile(st.session_state.profile_data)
+    col1, col2 = st.columns([1, 3])
+    col1.metric("⚡ ATS Pre-Score", f"{ats['score']}/100")
+    col2.caption("Instant local keyword check (no API call)")
+    if ats['missing']:
+        col2.markdown("**Missing:** " + ", ".join(ats['missing']))
+    
+    match = closest_run(json.dumps(st.session_state.profile_data, sort_keys=True))
+    if match:
+        score, run = match
+        col1, col2 = st.columns([3, 1])
+        col1.info(f"🔎 A {score:.0%} similar profile for this role was analyzed on {run['timestamp'][:16]} "
+                  f"({run['model'] or 'unknown model'})")
+        if col2.button("📂 Load Its Results", use_container_width=True):
+            show_results(run['id'], run['results'])
+            st.success("✅ Loaded. Check '📊 Results' tab")
+    use_cache = st.checkbox("♻️ Reuse cached responses for unchanged prompts", value=True)
+    stream = st.checkbox("📡 Stream agent output live", value=True)
+    incremental = st.checkbox("🧩 Only re-run agents whose inputs changed", value=True,
+                              help="Agents whose profile fields and upstream results match a previous "
+                                   "run reuse that run's output instead of calling the model")
+    hedge = st.checkbox("🏁 Hedge slow requests with a backup model", value=False,
+                        help="If a model is slower than usual (or still loading), also ask the fastest "
+                             "other model and keep whichever answers first")
+    reuse_similar = st.checkbox(f"🔁 Reuse Agents 1 & 2 from a ≥{SIMILARITY_THRESHOLD:.0%} similar profile",
+                                value=False,
+                                help="Skip the analysis and strategy review when a stored run with the same "
+                                     "model and target role has nearly the same profile text")
+    
+    run_clicked = st.button("▶️ Run 4-Agent Analysis", type="primary", use_container_width=True)
+    failed = st.session_state.get('failed_run')
+    resume_clicked = bool(failed) and len(roles) == 1 and st.button(
+        f"🔁 Resume Failed Run ({failed['completed']}/4 agents done)", use_container_width=True,
+        help="Re-run only the agents that did not finish; completed agents are not called again")
+    if run_clicked or resume_clicked:
+        with st.spinner("🤖 Agents working... (This may take 1-2 minutes)"):
+            state = run_multi_agent_system(st.session_state.profile_data, api_token, model,
+                                           use_cache, stream, hedge, incremental,
+                                           resume_id=failed['id'] if resume_clicked else None,
+                                           reuse_similar=reuse_similar, roles=roles)
+            
+            if state:
+                save_run_results(state)
+                show_job_results(state)
+                st.success("✅ Analysis complete! Check '📊 Results' tab")
+                st.balloons()
+            else:
+                st.error("❌ Analysis failed. Check messages above.")
+    elif job_id and st.session_state.get('following') == job_id:
+        # A widget click interrupted the page while it was following this run
+        reattach(job_id)
+    
+    render_agent_activity()
 
-def test_hf_connection(api_token, model):
-    result = hf_api_call(api_token, model, "Hello! Tell me a very short joke.", max_length=50)
-    return result
+@st.fragment
+def render_agent_activity():
+    """Agent log and metrics; re-renders on its own when its widgets change"""
+    logs = st.session_state.agent_logs
+    if logs:
+        st.divider()
+        st.subheader("📋 Agent Activity")
+        if len(logs) > MAX_LOG_ENTRIES:
+            st.caption(f"Showing the last {MAX_LOG_ENTRIES} of {len(logs)} entries")
+        # One markdown element for the whole log instead of one per entry
+        st.markdown("".join(
+            f'<div class="agent-box agent{log["agent"].split()[1].replace(":", "")}">'
+            f'<strong>{html.escape(log["agent"])}</strong> <small>[{log["timestamp"]}]</small><br>'
+            f'{html.escape(log["message"])}</div>'
+            for log in logs[-MAX_LOG_ENTRIES:]
+        ), unsafe_allow_html=True)
+    
+    spans = METRICS.run_spans(st.session_state.get('last_run_id'))
+    if spans:
+        st.subheader("⏱️ Run Breakdown")
+        st.dataframe([{
+            'Agent': span['agent'],
+            'Queue wait (s)': round(span['queue_wait'], 2),
+            'Request (s)': round(span['request_latency'], 2),
+            'First token (s)': round(span['ttft'], 2) if span['ttft'] is not None else None,
+            'Prompt tokens': span['prompt_tokens'],
+            'Completion tokens': span['completion_tokens'],
+            'Retries': span['retries'],
+            'Cached': span['cache_hit'],
+            'Outcome': span['outcome'],
+        } for span in spans], use_container_width=True)
+    
+    with st.expander("📈 Server Metrics (all sessions)"):
+        summary = METRICS.summary()
+        if summary:
+            st.dataframe(summary, use_container_width=True)
+        col1, col2 = st.columns(2)
+        col1.download_button("⬇️ Prometheus", METRICS.to_prometheus(), "metrics.prom",
+                             mime="text/plain", use_container_width=True)
+        col2.download_button("⬇️ JSON", METRICS.to_json(), "metrics.json",
+                             mime="application/json", use_container_width=True)
 
-def run_multi_agent_system(profile_data, api_token, model):
-    st.session_state.agent_logs = []
-    results = {}
+def render_structured(result, schema):
+    """Scores as metrics and lists as bullets for JSON results; free text as markdown"""
+    data = load_result(result, schema)
+    if data is None:
+        st.markdown(result or 'No results')
+        return
+    scores = [(field, spec) for field, spec in schema.items() if spec['type'] == 'score']
+    for column, (field, spec) in zip(st.columns(len(scores)), scores):
+        column.metric(spec['description'], f"{data[field]}/100")
+    for field, spec in schema.items():
+        if spec['type'] == 'list' and data[field]:
+            st.markdown(f"**{spec['description']}**\n" + "\n".join(f"- {item}" for item in data[field]))
+        elif spec['type'] == 'text' and data[field]:
+            st.markdown(f"**{spec['description']}:** {data[field]}")
+
+def render_role_comparison(run_ids):
+    """Scores, rewrite and review of each role of a fan-out run, side by side"""
+    st.subheader("🧭 Role Comparison")
+    st.caption("All roles share one Agent 1 analysis; strategy, rewrite and review are per role")
+    for column, (role, run_id) in zip(st.columns(len(run_ids)), run_ids.items()):
+        results = get_session_manager().results(st.session_state.session_id, run_id, slot=role)
+        scores = result_scores(results)
+        with column:
+            st.markdown(f"#### 🎯 {role}")
+            for field in ('quality_score', 'ats_score'):
+                st.metric(REVIEW_SCHEMA[field]['description'],
+                          f"{scores[field]}/100" if scores[field] is not None else "–")
+            with st.expander("✨ Optimized Profile"):
+                st.markdown(results.get('agent3', 'No results'))
+            with st.expander("🔎 Quality Review"):
+                render_structured(results.get('agent4'), REVIEW_SCHEMA)
+            if st.button("📂 Show in Full", key=f"compare_{run_id}", use_container_width=True):
+                show_results(run_id, results)
+                st.rerun()
+    st.divider()
+
+@st.fragment
+def render_results():
+    st.header("📊 Optimization Results")
     
-    agent1 = Agent1_Analyzer("Agent 1: Analyzer", "Initial Analysis", api_token, model)
-    agent2 = Agent2_ReAnalyzer("Agent 2: Re-Analyzer", "Critical Review", api_token, model)
-    agent3 = Agent3_Rewriter("Agent 3: Rewriter", "Profile Optimization", api_token, model)
-    agent4 = Agent4_Reviewer("Agent 4: Reviewer", "Quality Assurance", api_token, model)
+    target = st.session_state.profile_data.get('target_role')
+    history = recent_runs(target) if target else []
+    if history:
+        with st.expander(f"📚 Run History ({len(history)} recent for this role)"):
+            summary = role_scores(target)
+            if summary['scored']:
+                st.caption(f"Averages over {summary['scored']} scored runs for this role: "
+                           f"remote-readiness {summary['remote_readiness_score']}, "
+                           f"quality {summary['quality_score']}, ATS {summary['ats_score']}")
+            labels = {f"{run['timestamp'][:19]} · {run['model'] or 'unknown model'}"
+                      + (f" · quality {run['scores']['quality_score']}"
+                         if run['scores']['quality_score'] is not None else ""): run
+                      for run in history}
+            choice = st.selectbox("Previous runs", list(labels))
+            if st.button("📂 Load Run", use_container_width=True):
+                show_results(labels[choice]['id'], labels[choice]['results'])
+                st.rerun()
     
-    progress = st.progress(0)
-    status = st.empty()
+    if len(st.session_state.compare_run_ids) > 1:
+        render_role_comparison(st.session_state.compare_run_ids)
     
-    try:
-        status.markdown("### 🤖 Agent 1: Analyzing profile...")
-        progress.progress(25)
-        results['agent1'] = agent1.execute(profile_data)
-        if "❌" in results['agent1'] or "🔄" in results['agent1']:
-            st.warning(results['agent1'])
-            return None
-        time.sleep(2)
-        
-        status.markdown("### 🤖 Agent 2: Re-analyzing...")
-        progress.progress(50)
-        results['agent2'] = agent2.execute(profile_data, {'agent1_result': results['agent1']})
-        if "❌" in results['agent2'] or "🔄" in results['agent2']:
-            st.warning(results['agent2'])
-            return None
-        time.sleep(2)
-        
-        status.markdown("### 🤖 Agent 3: Rewriting profile...")
-        progress.progress(75)
-        results['agent3'] = agent3.execute(profile_data, {
-            'agent1_result': results['agent1'],
-            'agent2_result': results['agent2']
-        })
-        if "❌" in results['agent3'] or "🔄" in results['agent3']:
-            st.warning(results['agent3'])
-            return None
-        time.sleep(2)
-        
-        status.markdown("### 🤖 Agent 4: Final review...")
-        progress.progress(100)
-        results['agent4'] = agent4.execute(profile_data, {'agent3_result': results['agent3']})
-        if "❌" in results['agent4'] or "🔄" in results['agent4']:
-            st.warning(results['agent4'])
-            return None
-        
-        status.markdown("### ✅ Multi-agent analysis complete!")
-        return results
-    except Exception as e:
-        st.error(f"Error in multi-agent system: {e}")
-        return None
+    results = current_results()
+    if not results:
+        st.info("👆 Run the analysis first to see results here")
+        return
+    
+    
+    with st.expander("🔍 Agent 1: Initial Analysis", expanded=True):
+        render_structured(results.get('agent1'), ANALYSIS_SCHEMA)
+    
+    with st.expander("🔄 Agent 2: Critical Review"):
+        st.markdown(results.get('agent2', 'No results'))
+    
+    st.divider()
+    st.markdown("## ✨ Your Optimized LinkedIn Profile")
+    st.markdown("""
+    <div class="success-box">
+        📝 <strong>Ready to use!</strong> Copy these sections and paste directly into your LinkedIn profile.
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown(results.get('agent3', 'No results'))
+    
+    with st.expander("🔎 Agent 4: Quality Review"):
+        render_structured(results.get('agent4'), REVIEW_SCHEMA)
+    
+    st.divider()
+    st.subheader("💾 Export Options")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if st.button("📄 Save to File", use_container_width=True):
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            content = f"""OPTIMIZED LINKEDIN PROFILE
+Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+Target Role: {st.session_state.profile_data.get('target_role')}
 
-def save_data(data, filename):
-    path = os.path.join(DATA_DIR, filename)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    return path
+{results.get('agent3', '')}
 
-def load_data(filename):
-    path = os.path.join(DATA_DIR, filename)
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+QUALITY REVIEW:
+{to_markdown(results.get('agent4', ''), REVIEW_SCHEMA)}
+"""
+            path = os.path.join(DATA_DIR, f'linkedin_optimized_{timestamp}.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            st.success(f"✅ Saved: {path}")
+    
+    with col2:
+        st.download_button(
+            "⬇️ Download TXT",
+            data=results.get('agent3', ''),
+            file_name=f"linkedin_optimized_{datetime.now().strftime('%Y%m%d')}.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
 
 def main():
     st.title("💼 LinkedIn Multi-Agent Optimizer")
@@ -276,34 +565,22 @@ def main():
         st.subheader("🤖 Select Model")
         model = st.selectbox(
             "Choose Model (100% Free Tier)",
-            [
-                "Qwen/Qwen2.5-7B-Instruct",
-                "google/gemma-2-9b-it",
-                "meta-llama/Llama-3.2-3B-Instruct",
-                "mistralai/Mistral-7B-Instruct-v0.3"
-            ],
+            list(MODEL_INFO),
             help="All models work on free tier (Nov 2025)"
         )
-        
-        model_info = {
-            "Qwen/Qwen2.5-7B-Instruct": "⭐ Very fast & excellent",
-            "google/gemma-2-9b-it": "🎯 Excellent quality",
-            "meta-llama/Llama-3.2-3B-Instruct": "⚡ Fast & capable",
-            "mistralai/Mistral-7B-Instruct-v0.3": "🚀 Classic & reliable"
-        }
-        st.caption(model_info.get(model, ""))
+        st.caption(MODEL_INFO.get(model, ""))
         
         st.divider()
-        if api_token and st.button("🧪 Test Connection", use_container_width=True):
+        if (api_token or is_local(model)) and st.button("🧪 Test Connection", use_container_width=True):
             with st.spinner("Testing..."):
-                result = test_hf_connection(api_token, model)
-                if "❌" in result:
-                    st.error(result)
-                elif "🔄" in result:
-                    st.warning(result)
-                else:
+                try:
+                    result = test_hf_connection(api_token, model)
                     st.success("✅ Connection successful!")
                     st.write(f"Response: {result[:100]}...")
+                except ModelLoadingError as e:
+                    st.warning(str(e))
+                except InferenceError as e:
+                    st.error(str(e))
         
         st.divider()
         st.header("💾 Data Management")
@@ -318,11 +595,35 @@ def main():
             if st.button("📂 Load", use_container_width=True):
                 data = load_data("profile_data.json")
                 if data:
-                    st.session_state.profile_data = data
+                    st.session_state.profile_data = clamp_profile(data)
                     st.success("Loaded!")
                     st.rerun()
         
-        st.caption(f"📁 {os.path.abspath(DATA_DIR)}")
+        st.caption(f"📁 {os.path.abspath(DATA_DIR)} · {stored_run_count()} runs stored")
+        if st.button("📦 Export History (Parquet)", use_container_width=True):
+            path = os.path.join(DATA_DIR, "runs_history.parquet")
+            try:
+                with st.spinner("Exporting stored runs..."):
+                    count = export_runs(path)
+                    groups, _ = summary(path, ('model',))
+                st.success(f"✅ {count} runs → {path}")
+                st.dataframe([{'Model': group['model'], 'Runs': group['runs'],
+                               'Quality': group['quality_score_mean'], 'ATS': group['ats_score_mean'],
+                               'Remote-ready': group['remote_readiness_score_mean']} for group in groups],
+                             hide_index=True)
+            except ImportError as e:
+                st.error(f"❌ {e}")
+        
+        cache_stats = RESPONSE_CACHE.stats()
+        st.caption(f"🗄️ Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+        if st.button("🧹 Clear Cache", use_container_width=True):
+            RESPONSE_CACHE.clear()
+            st.success("Cache cleared!")
+        
+        usage = get_session_manager().usage()
+        rss = f" · RSS {usage['rss_bytes'] / 2**20:.0f} MB" if usage['rss_bytes'] else ""
+        st.caption(f"🧠 {usage['active']} active sessions · results cache "
+                   f"{usage['cached_bytes'] / 2**20:.1f}/{usage['budget_bytes'] / 2**20:.0f} MB{rss}")
     
     # Main tabs
     tab1, tab2, tab3 = st.tabs(["📝 Input Profile", "🤖 Run Analysis", "📊 Results"])
@@ -341,19 +642,21 @@ def main():
         if target_role:
             st.session_state.profile_data['target_role'] = target_role
         
-        if 'servicenow' in target_role.lower() or 'gen ai' in target_role.lower():
+        if role_family(target_role) == 'servicenow_genai':
             st.success("🎯 ServiceNow + Gen AI is HOT for remote roles!")
+        compare_roles = st.text_input(
+            "➕ Also compare for these roles (optional)",
+            value=", ".join(st.session_state.compare_roles),
+            placeholder="e.g., Platform Engineer, Site Reliability Engineer",
+            help=f"Comma-separated, up to {MAX_COMPARE_ROLES}. The profile is analyzed once and "
+                 "rewritten and reviewed for each role, with the results shown side by side"
+        )
+        st.session_state.compare_roles = [role.strip()[:100] for role in compare_roles.split(",")
+                                          if role.strip()][:MAX_COMPARE_ROLES]
+        
+        if target_role:
             with st.expander("💡 Keywords to Include"):
-                st.markdown("""
-                **Must-Have Keywords:**
-                - ServiceNow (ITSM, ITOM, CSM, HRSD)
-                - Gen AI / Generative AI / LLM
-                - Virtual Agent, Chatbot
-                - Flow Designer, Integration Hub
-                - API, REST, JavaScript, Python
-                - Remote, Distributed, Async
-                - Agile, Scrum, CI/CD
-                """)
+                st.markdown("**Must-Have Keywords:**\n" + "\n".join(f"- {keyword}" for keyword in family_keywords(target_role)))
         
         st.divider()
         
@@ -409,7 +712,8 @@ def main():
                 submitted = st.form_submit_button("💾 Save Profile", use_container_width=True, type="primary")
                 
                 if submitted:
-                    st.session_state.profile_data.update({
+                    st.session_state.profile_data = clamp_profile({
+                        **st.session_state.profile_data,
                         'headline': headline,
                         'about': about,
                         'experience': experience,
@@ -450,7 +754,7 @@ alert('✅ Copied! Paste in the app.');
             if st.button("📥 Import", use_container_width=True, type="primary"):
                 try:
                     data = json.loads(json_input)
-                    st.session_state.profile_data.update(data)
+                    st.session_state.profile_data = clamp_profile({**st.session_state.profile_data, **data})
                     st.success("✅ Imported! Go to '🤖 Run Analysis' tab")
                     st.rerun()
                 except:
@@ -471,23 +775,17 @@ alert('✅ Copied! Paste in the app.');
             
             if uploaded and st.button("📄 Extract", type="primary"):
                 try:
-                    import PyPDF2
-                    reader = PyPDF2.PdfReader(uploaded)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text()
+                    fields, text, pages = parse_linkedin_pdf(uploaded.getvalue())
                     
-                    st.info(f"✅ Extracted {len(text)} characters")
+                    st.info(f"✅ Extracted {len(text)} characters from {pages} page(s)")
+                    st.caption("Detected: " + ", ".join(f"{field} ({len(value)} chars)" for field, value in fields.items()))
                     st.text_area("Preview:", text[:500], height=200)
                     
-                    # Simple parsing
-                    st.session_state.profile_data.update({
-                        'about': text[:1000],
-                        'experience': text[1000:2000],
-                        'skills': text[2000:2500]
-                    })
+                    st.session_state.profile_data = clamp_profile({**st.session_state.profile_data, **fields})
                     st.success("✅ Imported! Review and edit if needed.")
                     
+                except PDFTooLarge as e:
+                    st.error(f"❌ {e}. Export only your profile from LinkedIn.")
                 except ImportError:
                     st.error("❌ Install PyPDF2: pip install PyPDF2")
                 except Exception as e:
@@ -502,110 +800,10 @@ alert('✅ Copied! Paste in the app.');
                 st.write("**Skills:**", st.session_state.profile_data.get('skills', '')[:100])
     
     with tab2:
-        st.header("🤖 Multi-Agent Analysis")
-        
-        if not api_token:
-            st.error("⚠️ Enter your Hugging Face token in the sidebar!")
-            st.stop()
-        
-        if not st.session_state.profile_data:
-            st.warning("⚠️ Enter your profile in the 'Input Profile' tab first!")
-            st.stop()
-        
-        if not st.session_state.profile_data.get('target_role'):
-            st.error("⚠️ Specify your target role!")
-            st.stop()
-        
-        st.info(f"🎯 Optimizing for: **{st.session_state.profile_data.get('target_role')}**")
-        st.caption(f"🤖 Using: {model}")
-        
-        if st.button("▶️ Run 4-Agent Analysis", type="primary", use_container_width=True):
-            with st.spinner("🤖 Agents working... (This may take 1-2 minutes)"):
-                results = run_multi_agent_system(st.session_state.profile_data, api_token, model)
-                
-                if results:
-                    st.session_state.analysis_results = results
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    save_data({
-                        'profile': st.session_state.profile_data,
-                        'results': results,
-                        'timestamp': datetime.now().isoformat()
-                    }, f'results_{timestamp}.json')
-                    st.success("✅ Analysis complete! Check '📊 Results' tab")
-                    st.balloons()
-                else:
-                    st.error("❌ Analysis failed. Check messages above.")
-        
-        if st.session_state.agent_logs:
-            st.divider()
-            st.subheader("📋 Agent Activity")
-            for log in st.session_state.agent_logs:
-                agent_num = log['agent'].split()[1].replace(':', '')
-                st.markdown(f"""
-                <div class="agent-box agent{agent_num}">
-                    <strong>{log['agent']}</strong> <small>[{log['timestamp']}]</small><br>
-                    {log['message']}
-                </div>
-                """, unsafe_allow_html=True)
+        render_analysis_tab(api_token, model)
     
     with tab3:
-        st.header("📊 Optimization Results")
-        
-        if not st.session_state.analysis_results:
-            st.info("👆 Run the analysis first to see results here")
-            st.stop()
-        
-        results = st.session_state.analysis_results
-        
-        with st.expander("🔍 Agent 1: Initial Analysis", expanded=True):
-            st.markdown(results.get('agent1', 'No results'))
-        
-        with st.expander("🔄 Agent 2: Critical Review"):
-            st.markdown(results.get('agent2', 'No results'))
-        
-        st.divider()
-        st.markdown("## ✨ Your Optimized LinkedIn Profile")
-        st.markdown("""
-        <div class="success-box">
-            📝 <strong>Ready to use!</strong> Copy these sections and paste directly into your LinkedIn profile.
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown(results.get('agent3', 'No results'))
-        
-        with st.expander("🔎 Agent 4: Quality Review"):
-            st.markdown(results.get('agent4', 'No results'))
-        
-        st.divider()
-        st.subheader("💾 Export Options")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("📄 Save to File", use_container_width=True):
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                content = f"""OPTIMIZED LINKEDIN PROFILE
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Target Role: {st.session_state.profile_data.get('target_role')}
-
-{results.get('agent3', '')}
-
-QUALITY REVIEW:
-{results.get('agent4', '')}
-"""
-                path = os.path.join(DATA_DIR, f'linkedin_optimized_{timestamp}.txt')
-                with open(path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                st.success(f"✅ Saved: {path}")
-        
-        with col2:
-            st.download_button(
-                "⬇️ Download TXT",
-                data=results.get('agent3', ''),
-                file_name=f"linkedin_optimized_{datetime.now().strftime('%Y%m%d')}.txt",
-                mime="text/plain",
-                use_container_width=True
-            )
+        render_results()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
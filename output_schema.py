@@ -0,0 +1,157 @@
+import json
+import math
+import re
+from prompt_budget import count_tokens
+
+# Declared outputs of the agents that answer in JSON. Field types: 'score' is an
+# integer 0-100, 'list' an array of `items` strings, 'text' one string; `words`
+# caps each string and, with the field count, sets the generation budget.
+# `description` labels the field in the UI and `hint` (default: description) in the prompt
+ANALYSIS_SCHEMA = {
+    'remote_readiness_score': {'type': 'score', 'description': "Remote-Readiness Score"},
+    'strengths': {'type': 'list', 'items': 3, 'words': 15, 'description': "Top strengths"},
+    'gaps': {'type': 'list', 'items': 3, 'words': 15, 'description': "Critical gaps"},
+    'missing_keywords': {'type': 'list', 'items': 5, 'words': 4,
+                         'description': "Missing ATS keywords",
+                         'hint': "most important missing ATS keywords, from the check above or others"},
+    'priority_improvements': {'type': 'list', 'items': 3, 'words': 20, 'description': "Priority improvements"},
+}
+REVIEW_SCHEMA = {
+    'quality_score': {'type': 'score', 'description': "Quality Score"},
+    'ats_score': {'type': 'score', 'description': "ATS Compatibility Score"},
+    'strengths': {'type': 'list', 'items': 3, 'words': 15, 'description': "Top strengths"},
+    'issues': {'type': 'list', 'items': 2, 'words': 20, 'description': "Remaining issues"},
+    'recommendation': {'type': 'text', 'words': 40, 'description': "Final recommendation"},
+}
+# Result key -> schema of that agent's structured output
+AGENT_SCHEMAS = {
+    'agent1': ANALYSIS_SCHEMA,
+    'agent4': REVIEW_SCHEMA,
+}
+# Score fields, stored as indexed columns of the runs table
+SCORE_COLUMNS = tuple(field for schema in AGENT_SCHEMAS.values()
+                      for field, spec in schema.items() if spec['type'] == 'score')
+
+def _score_pattern(label):
+    # "<label>", an optional "(0-100)", then the first number within a few characters
+    return re.compile(label + r"\s*(?:\(0\s*-\s*100\))?\D{0,20}?(\d{1,3})", re.I)
+
+# Where the same scores appear in free-text results written before the schemas
+FREE_TEXT_SCORES = {
+    'remote_readiness_score': ('agent1', _score_pattern(r"remote[- ]readiness score")),
+    'quality_score': ('agent4', _score_pattern(r"quality score")),
+    'ats_score': ('agent4', _score_pattern(r"ats compatibility score")),
+}
+
+# Generated tokens per word of English prose, plus a margin so valid answers are never cut off
+TOKENS_PER_WORD = 1.4
+BUDGET_MARGIN = 1.2
+
+class SchemaError(ValueError):
+    pass
+
+def schema_instructions(schema):
+    """Prompt text asking for a JSON object matching `schema`"""
+    lines = []
+    for field, spec in schema.items():
+        if spec['type'] == 'score':
+            shape = "integer 0-100"
+        elif spec['type'] == 'list':
+            shape = f"array of {spec['items']} strings, max {spec['words']} words each"
+        else:
+            shape = f"string, max {spec['words']} words"
+        lines.append(f'"{field}": {shape} ({spec.get("hint", spec["description"])})')
+    return ("Respond with ONLY a JSON object, no markdown or code fences, with exactly these keys:\n"
+            + "\n".join(lines))
+
+def schema_max_tokens(schema, model=None):
+    """Generation budget for a complete answer to `schema`"""
+    skeleton = json.dumps({field: [""] * spec.get('items', 1) if spec['type'] == 'list' else 100
+                           for field, spec in schema.items()})
+    words = sum(spec.get('words', 0) * spec.get('items', 1) for spec in schema.values())
+    return math.ceil((count_tokens(skeleton, model) + words * TOKENS_PER_WORD) * BUDGET_MARGIN)
+
+def parse_output(text, schema):
+    """Validated object from a model's JSON answer; raises SchemaError.
+
+    Tolerates code fences and text around the object. Scores are coerced to
+    integers in 0-100 and lists are cut to their declared length; a missing
+    field or a value of the wrong shape is an error.
+    """
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end < start:
+        raise SchemaError("no JSON object in the response")
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise SchemaError(f"invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise SchemaError("response is not a JSON object")
+    parsed = {}
+    for field, spec in schema.items():
+        if field not in data:
+            raise SchemaError(f"missing field '{field}'")
+        value = data[field]
+        if spec['type'] == 'score':
+            try:
+                value = float(str(value).split('/')[0].strip().rstrip('%'))
+            except ValueError:
+                raise SchemaError(f"'{field}' is not a number")
+            # json.loads accepts NaN and Infinity, which round() cannot take
+            if not math.isfinite(value):
+                raise SchemaError(f"'{field}' is not a finite number")
+            parsed[field] = max(0, min(100, round(value)))
+        elif spec['type'] == 'list':
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list):
+                raise SchemaError(f"'{field}' is not a list")
+            items = [str(item).strip() for item in value if str(item).strip()]
+            parsed[field] = items[:spec['items']]
+        else:
+            if isinstance(value, (dict, list)):
+                raise SchemaError(f"'{field}' is not text")
+            parsed[field] = str(value).strip()
+    return parsed
+
+def load_result(result, schema):
+    """Structured object of a stored agent result, or None for free-text results"""
+    if not result or not result.lstrip().startswith('{'):
+        return None
+    try:
+        return parse_output(result, schema)
+    except SchemaError:
+        return None
+
+def result_scores(results):
+    """{score column: value} of a run's results, None where unavailable.
+
+    Read from the structured results, or found in the prose of free-text ones.
+    """
+    scores = dict.fromkeys(SCORE_COLUMNS)
+    for key, schema in AGENT_SCHEMAS.items():
+        data = load_result(results.get(key), schema)
+        if data:
+            scores.update({field: data[field] for field in scores if field in data})
+    for field, (key, pattern) in FREE_TEXT_SCORES.items():
+        if scores[field] is None and isinstance(results.get(key), str):
+            match = pattern.search(results[key])
+            if match and int(match.group(1)) <= 100:
+                scores[field] = int(match.group(1))
+    return scores
+
+def to_markdown(result, schema):
+    """Structured result rendered as markdown; free-text results are returned as they are"""
+    data = load_result(result, schema)
+    if data is None:
+        return result or ''
+    parts = []
+    for field, spec in schema.items():
+        value = data[field]
+        if spec['type'] == 'score':
+            parts.append(f"**{spec['description']}:** {value}/100")
+        elif spec['type'] == 'list':
+            parts.append(f"**{spec['description']}:**\n" + "\n".join(f"- {item}" for item in value))
+        else:
+            parts.append(f"**{spec['description']}:** {value}")
+    return "\n\n".join(parts)
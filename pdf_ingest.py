@@ -0,0 +1,124 @@
+import io
+import re
+
+# Ingestion limits
+MAX_PAGES = 10
+MAX_BYTES = 10 * 1024 * 1024
+MAX_FIELD_CHARS = 5000
+# Extraction stops after the page that brings the text past this many characters
+MAX_TEXT_CHARS = 50000
+
+# LinkedIn "Save to PDF" headings -> profile field (None = section we skip)
+SECTION_HEADINGS = {
+    'summary': 'about',
+    'about': 'about',
+    'experience': 'experience',
+    'top skills': 'skills',
+    'skills': 'skills',
+    'education': 'education',
+    'contact': None,
+    'languages': None,
+    'certifications': None,
+    'honors-awards': None,
+    'honors & awards': None,
+    'publications': None,
+    'patents': None,
+    'projects': None,
+    'volunteer experience': None,
+    'recommendations': None,
+}
+# Sections that start the main column, right after name, headline and location
+MAIN_SECTIONS = ('about', 'experience')
+
+PAGE_FOOTER = re.compile(r'^page \d+ of \d+$', re.IGNORECASE)
+
+class PDFTooLarge(ValueError):
+    pass
+
+def _pdf_reader(data):
+    try:
+        from PyPDF2 import PdfReader
+    except ImportError:
+        from pypdf import PdfReader
+    return PdfReader(io.BytesIO(data))
+
+def iter_page_texts(source, max_pages=MAX_PAGES, max_bytes=MAX_BYTES, max_chars=MAX_TEXT_CHARS):
+    """Yield the text of each page in order, extracting a page only when it is asked for.
+
+    `source` is raw bytes or a file-like object (e.g. a Streamlit upload).
+    Extraction stops after `max_pages` pages, or once `max_chars` characters
+    were yielded. Text extraction is pure Python, so threads would not
+    speed it up; a profile export is a handful of pages.
+    """
+    data = source if isinstance(source, bytes) else source.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise PDFTooLarge(f"PDF is larger than {max_bytes // (1024 * 1024)} MB")
+    reader = _pdf_reader(data)
+    chars = 0
+    for i in range(min(len(reader.pages), max_pages)):
+        if chars >= max_chars:
+            return
+        text = reader.pages[i].extract_text() or ""
+        chars += len(text)
+        yield text
+
+def parse_sections(lines):
+    """Single pass over text lines, routing each line to the section it sits under.
+
+    Returns (sections, headline): sections maps profile fields to their
+    lines. The headline is the line before the location that precedes the
+    first main-column heading, which is where LinkedIn exports place it.
+    """
+    sections = {}
+    current = None
+    preamble = []
+    headline = None
+    for raw in lines:
+        line = raw.strip()
+        if not line or PAGE_FOOTER.match(line):
+            continue
+        key = line.lower()
+        if key in SECTION_HEADINGS:
+            field = SECTION_HEADINGS[key]
+            if headline is None and field in MAIN_SECTIONS and len(preamble) >= 2:
+                headline = preamble[-2]
+            current = field
+            preamble = []
+            continue
+        preamble.append(line)
+        if current:
+            sections.setdefault(current, []).append(line)
+    return sections, headline
+
+def parse_linkedin_pdf(source, max_pages=MAX_PAGES, max_bytes=MAX_BYTES):
+    """Extract a LinkedIn PDF export into profile fields.
+
+    Falls back to fixed slices of the raw text when no LinkedIn headings
+    are found (e.g. a resume in a different layout).
+    """
+    page_texts = []
+    def lines():
+        # Sections are parsed as pages are extracted
+        for text in iter_page_texts(source, max_pages, max_bytes):
+            page_texts.append(text)
+            yield from text.splitlines()
+    sections, headline = parse_sections(lines())
+    text = "\n".join(page_texts)
+
+    if not sections:
+        return {
+            'about': text[:1000],
+            'experience': text[1000:2000],
+            'skills': text[2000:2500],
+        }, text, len(page_texts)
+
+    profile = {
+        'about': " ".join(sections.get('about', []))[:MAX_FIELD_CHARS],
+        'experience': "\n".join(sections.get('experience', []))[:MAX_FIELD_CHARS],
+        'skills': ", ".join(sections.get('skills', []))[:MAX_FIELD_CHARS],
+    }
+    if sections.get('education'):
+        profile['education'] = "\n".join(sections['education'])[:MAX_FIELD_CHARS]
+    if headline:
+        profile['headline'] = headline
+    return {field: value for field, value in profile.items() if value}, text, len(page_texts)
@@ -0,0 +1,116 @@
+import math
+import os
+import re
+import threading
+from functools import lru_cache
+
+# Input-token budget for the profile/upstream text each agent embeds. 'profile' is
+# the headline/about block Agents 1 and 3 share; 'agent1' covers what it adds on top
+AGENT_INPUT_BUDGETS = {
+    'profile': 300,
+    'agent1': 300,
+    'agent2': 300,
+    'agent4': 400,
+}
+
+# LinkedIn UI text that gets copied along with profile sections
+BOILERPLATE_LINES = re.compile(
+    r"^(…?\s*see more|see less|show more|show less|show all .*|endorse|endorsed by .*|"
+    r"\d+ endorsements?|.*logo|followers?|\d+ followers)$",
+    re.IGNORECASE,
+)
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+|\n+")
+TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+def _tokenizer_file(model):
+    if os.path.isdir(model):
+        path = os.path.join(model, "tokenizer.json")
+        return path if os.path.isfile(path) else None
+    from huggingface_hub import try_to_load_from_cache
+    path = try_to_load_from_cache(model, "tokenizer.json")
+    return path if isinstance(path, str) else None
+
+def _tokenizer(model):
+    # Exact counts when the model's tokenizer is already on disk; None otherwise.
+    # Never downloads: this runs while prompts are built, and must not stall offline
+    with _tokenizers_lock:
+        if model not in _tokenizers:
+            try:
+                from tokenizers import Tokenizer
+                path = _tokenizer_file(model)
+                _tokenizers[model] = Tokenizer.from_file(path) if path else None
+            except Exception:
+                _tokenizers[model] = None
+        return _tokenizers[model]
+
+@lru_cache(maxsize=8192)
+def count_tokens(text, model=None):
+    """Token count of `text` for `model`, estimated when no tokenizer is available"""
+    if not text:
+        return 0
+    tokenizer = _tokenizer(model) if model else None
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    # BPE vocabularies average roughly four characters per token for English words
+    return sum(math.ceil(len(piece) / 4) for piece in TOKEN_PIECES.findall(text))
+
+@lru_cache(maxsize=2048)
+def compact(text):
+    """Drop LinkedIn boilerplate and repeated lines, collapse whitespace"""
+    lines, seen = [], set()
+    for line in (text or '').splitlines():
+        line = " ".join(line.split())
+        if not line or BOILERPLATE_LINES.match(line):
+            continue
+        # Copy-paste from LinkedIn duplicates titles (visible + screen-reader text)
+        if line in seen and len(line) < 120:
+            continue
+        seen.add(line)
+        lines.append(line)
+    return "\n".join(lines)
+
+def truncate_to_tokens(text, budget, model=None):
+    """Longest prefix of whole sentences (or words, for the first one) within `budget`"""
+    if count_tokens(text, model) <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    kept, used = [], 0
+    for sentence in SENTENCE_END.split(text):
+        cost = count_tokens(sentence, model) + 1
+        if used + cost > budget:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept)
+    words, kept = text.split(), []
+    for word in words:
+        cost = count_tokens(word, model) + 1
+        if used + cost > budget:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept) + " …"
+
+def allocate(fields, budget, model=None):
+    """Fit several prompt fields into one token budget.
+
+    `fields` is a list of (name, text, weight) in priority order. Each field
+    first gets up to its weighted share of the budget; whatever short fields
+    leave unused goes to the remaining fields in priority order. Returns
+    {name: compacted, truncated text}.
+    """
+    texts = {name: compact(text) for name, text, _ in fields}
+    need = {name: count_tokens(texts[name], model) for name in texts}
+    total_weight = sum(weight for _, _, weight in fields) or 1
+    alloc = {name: min(need[name], int(budget * weight / total_weight)) for name, _, weight in fields}
+    leftover = budget - sum(alloc.values())
+    for name, _, _ in fields:
+        extra = min(need[name] - alloc[name], leftover)
+        alloc[name] += extra
+        leftover -= extra
+    return {name: truncate_to_tokens(texts[name], alloc[name], model) for name in texts}
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+# Client-side limits per Hugging Face token (free tier defaults)
+REQUESTS_PER_MINUTE = float(os.environ.get("HF_REQUESTS_PER_MINUTE", "30"))
+TOKENS_PER_MINUTE = float(os.environ.get("HF_TOKENS_PER_MINUTE", "20000"))
+
+class RateLimitTimeout(Exception):
+    """Raised when capacity will not be available before the caller's deadline"""
+
+class RateLimitCancelled(Exception):
+    """Raised when the caller's cancel event is set while it waits for capacity"""
+
+class TokenBucket:
+    """Thread-safe token bucket refilling `per_minute` units per minute up to `capacity`"""
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount, now):
+        """Take `amount` units and return how long the caller must wait for them"""
+        self._refill(now)
+        # Requests larger than the bucket are allowed once it is full
+        amount = min(amount, self.capacity)
+        self._level -= amount
+        return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def refund(self, amount):
+        self._level = min(self.capacity, self._level + min(amount, self.capacity))
+
+class RateLimiter:
+    """Shared request and token budget for one API token.
+
+    Callers reserve capacity up front and sleep until it is theirs, so
+    concurrent agents and sessions queue fairly instead of tripping the
+    provider's 429 limit. A server-sent Retry-After pauses every caller.
+    """
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0, deadline=None, cancel=None):
+        """Block until one request carrying `tokens` tokens may be sent; returns seconds waited.
+
+        Setting `cancel` (threading.Event) during the wait gives the capacity
+        back to the other callers and raises RateLimitCancelled.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1, now),
+                       self.tokens.reserve(tokens, now) if tokens else 0.0,
+                       self._paused_until - now)
+            if deadline is not None and now + wait > deadline:
+                # Give the capacity back; this request will not be sent
+                self.requests.refund(1)
+                if tokens:
+                    self.tokens.refund(tokens)
+                raise RateLimitTimeout(f"Rate limit wait of {wait:.1f}s exceeds the run deadline")
+        if wait > 0:
+            if cancel is None:
+                time.sleep(wait)
+            elif cancel.wait(wait):
+                with self._lock:
+                    self.requests.refund(1)
+                    if tokens:
+                        self.tokens.refund(tokens)
+                raise RateLimitCancelled("Cancelled while waiting for rate-limit capacity")
+        return wait
+
+    def pause(self, seconds):
+        """Hold back all callers for `seconds`, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def configure_rate_limiter(api_token, requests_per_minute=REQUESTS_PER_MINUTE,
+                           tokens_per_minute=TOKENS_PER_MINUTE):
+    """Replace the limiter for `api_token`, e.g. for a paid tier or a benchmark"""
+    with _limiters_lock:
+        limiter = _limiters[api_token] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return limiter
+
+def get_rate_limiter(api_token):
+    """Process-wide limiter for `api_token`, shared by all agents and sessions"""
+    with _limiters_lock:
+        limiter = _limiters.get(api_token)
+        if limiter is None:
+            limiter = _limiters[api_token] = RateLimiter()
+        return limiter
@@ -0,0 +1,48 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def run_agent_graph(agents, profile_data, max_workers=4, poll=None, poll_interval=0.1, completed=None):
+    """Run agents concurrently as soon as their declared inputs are ready.
+
+    `agents` maps a result key (e.g. 'agent1') to an agent whose `requires`
+    attribute lists the result keys it reads and whose `run` method
+    produces the result. Each agent receives a context
+    holding only those upstream results as '<key>_result'. Yields
+    (key, result) pairs in completion order; closing the generator early
+    cancels agents that have not started yet.
+
+    If `poll` is given it is called on the caller's thread every
+    `poll_interval` seconds while agents are running, e.g. to render
+    streamed tokens.
+
+    `completed` maps keys to results already available (e.g. checkpoints of
+    an earlier attempt); those agents are not run and their results are
+    yielded first. A value may also be a Future of a result computed
+    elsewhere (e.g. an agent shared by several pipelines); it is waited on
+    like a running agent but never cancelled here.
+    """
+    completed = {key: result for key, result in (completed or {}).items() if key in agents}
+    results = {key: result for key, result in completed.items() if not isinstance(result, Future)}
+    for key, result in results.items():
+        yield key, result
+    pending = {key: agent for key, agent in agents.items() if key not in completed}
+    running = {future: key for key, future in completed.items() if isinstance(future, Future)}
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+    try:
+        while pending or running:
+            for key, agent in list(pending.items()):
+                if all(dep in results for dep in agent.requires):
+                    context = {f"{dep}_result": results[dep] for dep in agent.requires}
+                    running[executor.submit(agent.run, profile_data, context)] = key
+                    del pending[key]
+            if not running:
+                raise ValueError(f"Unsatisfiable agent dependencies: {sorted(pending)}")
+            done, _ = wait(running, timeout=poll_interval if poll else None,
+                           return_when=FIRST_COMPLETED)
+            if poll:
+                poll()
+            for future in done:
+                key = running.pop(future)
+                results[key] = future.result()
+                yield key, results[key]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from storage import PROFILE_FIELDS, get_store
+
+# Per-session caps on what the UI keeps in st.session_state
+SESSION_PROFILE_FIELDS = PROFILE_FIELDS + ('education', 'timestamp')
+MAX_PROFILE_FIELD_CHARS = 5000
+MAX_SESSION_LOGS = 200
+# Results shown by all sessions of this process are cached within this budget;
+# sessions idle longer than SESSION_IDLE_SECONDS lose theirs first
+SESSION_MEMORY_BUDGET = int(float(os.environ.get("SESSION_MEMORY_BUDGET_MB", "64")) * 1024 * 1024)
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", "900"))
+
+def clamp_profile(profile):
+    """Known profile fields only, each cut to MAX_PROFILE_FIELD_CHARS"""
+    return {field: str(profile[field])[:MAX_PROFILE_FIELD_CHARS]
+            for field in SESSION_PROFILE_FIELDS if profile.get(field) is not None}
+
+def clamp_logs(logs):
+    return list(logs[-MAX_SESSION_LOGS:])
+
+def estimate_size(value):
+    """Approximate bytes held by nested dicts, lists and strings"""
+    if isinstance(value, str):
+        return 49 + len(value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(estimate_size(item) for item in value)
+    return 32
+
+def process_rss():
+    """Resident set size of this process in bytes, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class _SessionEntry:
+    def __init__(self, session_id, run_id, results, size):
+        self.session_id = session_id
+        self.run_id = run_id
+        self.results = results
+        self.size = size
+        self.last_seen = time.monotonic()
+
+class SessionManager:
+    """Heavy per-session data held outside st.session_state.
+
+    A session keeps only the run id of the results it shows; the results
+    themselves live in the results store and are cached here, one entry
+    per session and slot (e.g. one per role of a comparison), least
+    recently seen first out. Entries of sessions idle
+    for `idle_seconds` are dropped, and the rest are evicted oldest-first
+    whenever the total exceeds `budget` bytes. An evicted session simply
+    reloads its results from the store on its next rerun.
+    """
+    def __init__(self, budget=SESSION_MEMORY_BUDGET, idle_seconds=SESSION_IDLE_SECONDS):
+        self.budget = budget
+        self.idle_seconds = idle_seconds
+        self._entries = OrderedDict()
+        self._seen = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+    def touch(self, session_id):
+        """Mark a session active; call once per script run"""
+        with self._lock:
+            self._seen[session_id] = time.monotonic()
+            for key in self._session_keys(session_id):
+                self._entries[key].last_seen = self._seen[session_id]
+                self._entries.move_to_end(key)
+            self._sweep()
+
+    def put(self, session_id, run_id, results, slot=None):
+        """Cache results the session already has in hand (e.g. a run that just finished)"""
+        with self._lock:
+            self._set((session_id, slot), run_id, results)
+
+    def results(self, session_id, run_id, slot=None):
+        """Results of `run_id` for this session, from the cache or the store ({} if unknown)"""
+        key = (session_id, slot)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.run_id == run_id:
+                self.stats['hits'] += 1
+                entry.last_seen = time.monotonic()
+                self._entries.move_to_end(key)
+                return entry.results
+        run = get_store().get_run(run_id)
+        results = run['results'] if run else {}
+        with self._lock:
+            self.stats['loads'] += 1
+            self._set(key, run_id, results)
+        return results
+
+    def forget(self, session_id):
+        with self._lock:
+            for key in self._session_keys(session_id):
+                self._drop(key)
+            self._seen.pop(session_id, None)
+
+    def usage(self):
+        """Sessions seen, active sessions, cached bytes against the budget, and process RSS"""
+        with self._lock:
+            self._sweep()
+            now = time.monotonic()
+            return {
+                'sessions': len(self._seen),
+                'active': sum(1 for seen in self._seen.values() if now - seen < self.idle_seconds),
+                'cached_sessions': len({entry.session_id for entry in self._entries.values()}),
+                'cached_bytes': self._bytes,
+                'budget_bytes': self.budget,
+                'rss_bytes': process_rss(),
+                **self.stats,
+            }
+
+    def _session_keys(self, session_id):
+        return [key for key, entry in self._entries.items() if entry.session_id == session_id]
+
+    def _set(self, key, run_id, results):
+        self._drop(key)
+        size = estimate_size(results)
+        # A single result set larger than the whole budget is served but not cached
+        if size <= self.budget:
+            self._entries[key] = _SessionEntry(key[0], run_id, results, size)
+            self._bytes += size
+        self._seen[key[0]] = time.monotonic()
+        self._sweep(keep=key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _sweep(self, keep=None):
+        now = time.monotonic()
+        for session_id, seen in list(self._seen.items()):
+            if now - seen >= self.idle_seconds:
+                for key in self._session_keys(session_id):
+                    self._drop(key)
+                    self.stats['evictions'] += 1
+                # Sessions idle for a long time are assumed closed
+                if now - seen >= 4 * self.idle_seconds:
+                    del self._seen[session_id]
+        for key in list(self._entries):
+            if self._bytes <= self.budget:
+                break
+            if key != keep:
+                self._drop(key)
+                self.stats['evictions'] += 1
+
+_session_manager = None
+_session_manager_lock = threading.Lock()
+
+def get_session_manager():
+    """Process-wide SessionManager shared by every UI session"""
+    global _session_manager
+    with _session_manager_lock:
+        if _session_manager is None:
+            _session_manager = SessionManager()
+        return _session_manager
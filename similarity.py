@@ -0,0 +1,71 @@
+"""Near-duplicate detection for stored profiles.
+
+Profiles are compared by the Jaccard similarity of their word 3-gram
+shingles, estimated from a 64-value one-permutation MinHash signature:
+each shingle hash falls into one of 64 bins and each bin keeps its
+minimum, so a signature costs one hash per shingle. Signatures are split
+into LSH bands (see ResultsStore.find_similar_runs), so only runs that
+share a band with a profile are ever compared to it.
+"""
+import hashlib
+from array import array
+from ats import tokenize
+
+NUM_BINS = 64
+# 8 bands of 8 bins puts the LSH candidate threshold near 0.77 similarity
+BANDS = 8
+ROWS = NUM_BINS // BANDS
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.9
+SIMILARITY_FIELDS = ('headline', 'about', 'experience', 'skills')
+
+# A bin value keeps the hash bits above the bin index; the top 6 bits record
+# how far an empty bin had to borrow from (densification)
+_VALUE_BITS = 58
+_EMPTY = 1 << _VALUE_BITS
+
+def role_key(target_role):
+    """Normalized target role; only profiles aimed at the same role are compared"""
+    return " ".join(tokenize(target_role or ''))
+
+def shingles(profile):
+    tokens = tokenize(" ".join(profile.get(field) or '' for field in SIMILARITY_FIELDS))
+    if len(tokens) < SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+def signature(profile):
+    """MinHash signature of the profile's shingles as array('Q') of NUM_BINS values.
+
+    None for a profile without any text: it has no shingles, and any two of
+    them would otherwise look identical.
+    """
+    bins = [_EMPTY] * NUM_BINS
+    for shingle in shingles(profile):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        index, value = h % NUM_BINS, (h // NUM_BINS) & (_EMPTY - 1)
+        if value < bins[index]:
+            bins[index] = value
+    filled = [i for i in range(NUM_BINS) if bins[i] != _EMPTY]
+    if not filled:
+        return None
+    sig = array('Q', bins)
+    for i in range(NUM_BINS):
+        if bins[i] == _EMPTY:
+            # Empty bins take the next filled bin's value, tagged with the distance
+            source = next((f for f in filled if f > i), filled[0] + NUM_BINS)
+            sig[i] = bins[source % NUM_BINS] | ((source - i) << _VALUE_BITS)
+    return sig
+
+def band_keys(sig, role):
+    """One LSH bucket id per band, scoped to the target role; fits a SQLite INTEGER"""
+    keys = []
+    for band in range(BANDS):
+        payload = f"{role}|" + ",".join(map(str, sig[band * ROWS:(band + 1) * ROWS]))
+        digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=7).digest()
+        keys.append(int.from_bytes(digest, 'little') | (band << 56))
+    return keys
+
+def estimate(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_BINS
@@ -0,0 +1,438 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from array import array
+from datetime import datetime
+import similarity
+from config import DATA_DIR
+from output_schema import SCORE_COLUMNS, result_scores
+
+DB_PATH = os.path.join(DATA_DIR, "results.db")
+
+# Profile fields that identify a profile for lookups and caching
+PROFILE_FIELDS = ('target_role', 'headline', 'about', 'experience', 'skills')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    created_at TEXT NOT NULL,
+    profile_hash TEXT NOT NULL,
+    target_role TEXT,
+    model TEXT,
+    profile TEXT NOT NULL,
+    results TEXT NOT NULL,
+    timings TEXT,
+    remote_readiness_score INTEGER,
+    quality_score INTEGER,
+    ats_score INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_runs_profile_hash ON runs (profile_hash, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_target_role ON runs (target_role, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs (model, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs (created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_name ON runs (name);
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agent_results (
+    fingerprint TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    model TEXT,
+    result TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoint_runs (
+    run_id TEXT PRIMARY KEY,
+    profile_hash TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    model TEXT,
+    error TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, agent)
+);
+CREATE TABLE IF NOT EXISTS run_signatures (
+    run_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    bucket INTEGER NOT NULL,
+    run_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets (bucket);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def profile_hash(profile):
+    """Content hash of the profile fields the agents read"""
+    fields = {field: profile.get(field) or '' for field in PROFILE_FIELDS}
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResultsStore:
+    """SQLite-backed history of analysis runs plus small named JSON documents.
+
+    Uses WAL mode and one connection per thread, so several Streamlit
+    sessions, batch workers and API workers can write concurrently.
+    """
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn):
+        """Add score columns (and their indexes) to databases created before they existed"""
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(runs)")}
+        for column in SCORE_COLUMNS:
+            if column not in columns:
+                conn.execute(f"ALTER TABLE runs ADD COLUMN {column} INTEGER")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_runs_{column} ON runs ({column}, created_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save_run(self, profile, results, model=None, timings=None, name=None, created_at=None, run_id=None):
+        """Insert one run and return its id"""
+        run_id = run_id or uuid.uuid4().hex
+        scores = result_scores(results)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO runs (id, name, created_at, profile_hash, target_role, model, "
+                f"profile, results, timings, {', '.join(SCORE_COLUMNS)}) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?{', ?' * len(SCORE_COLUMNS)})",
+                (run_id, name, created_at or datetime.now().isoformat(), profile_hash(profile),
+                 profile.get('target_role'), model, json.dumps(profile, ensure_ascii=False),
+                 json.dumps(results, ensure_ascii=False),
+                 json.dumps(timings) if timings is not None else None,
+                 *(scores[column] for column in SCORE_COLUMNS)))
+            self._index_signature(conn, run_id, profile)
+        return run_id
+
+    def _index_signature(self, conn, run_id, profile):
+        """Add the run's MinHash signature and LSH buckets to the similarity index.
+
+        A profile without text has no signature and is left out of the index.
+        """
+        sig = similarity.signature(profile)
+        role = similarity.role_key(profile.get('target_role'))
+        row = conn.execute("SELECT signature, role FROM run_signatures WHERE run_id = ?", (run_id,)).fetchone()
+        if row is not None:
+            if sig is not None and row['signature'] == sig.tobytes() and row['role'] == role:
+                return
+            # Old buckets are recomputed from the old signature; lsh_buckets is only indexed by bucket
+            old = array('Q', row['signature'])
+            conn.executemany("DELETE FROM lsh_buckets WHERE bucket = ? AND run_id = ?",
+                             [(bucket, run_id) for bucket in similarity.band_keys(old, row['role'])])
+        if sig is None:
+            conn.execute("DELETE FROM run_signatures WHERE run_id = ?", (run_id,))
+            return
+        conn.execute("INSERT OR REPLACE INTO run_signatures (run_id, signature, role) VALUES (?, ?, ?)",
+                     (run_id, sig.tobytes(), role))
+        conn.executemany("INSERT INTO lsh_buckets (bucket, run_id) VALUES (?, ?)",
+                         [(bucket, run_id) for bucket in similarity.band_keys(sig, role)])
+
+    def find_similar_runs(self, profile, threshold=similarity.SIMILARITY_THRESHOLD, limit=3,
+                          max_candidates=200, exclude=None, model=None):
+        """Stored runs for the same target role whose profile text is near-identical.
+
+        Returns [(estimated Jaccard similarity, run)] best first. Candidates
+        come from the LSH buckets, so the cost depends on how many runs
+        share a bucket with this profile, not on the size of the history.
+        With `model`, only runs of that model are candidates at all.
+        """
+        sig = similarity.signature(profile)
+        if sig is None:
+            return []
+        buckets = similarity.band_keys(sig, similarity.role_key(profile.get('target_role')))
+        model_clause, params = ("AND r.model = ?", (model,)) if model is not None else ("", ())
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT s.run_id, s.signature FROM run_signatures s WHERE s.run_id IN "
+            f"(SELECT DISTINCT b.run_id FROM lsh_buckets b JOIN runs r ON r.id = b.run_id "
+            f"WHERE b.bucket IN ({','.join('?' * len(buckets))}) {model_clause} LIMIT ?)",
+            (*buckets, *params, max_candidates)).fetchall()
+        scored = []
+        for row in rows:
+            if row['run_id'] == exclude:
+                continue
+            score = similarity.estimate(sig, array('Q', row['signature']))
+            if score >= threshold:
+                scored.append((score, row['run_id']))
+        scored.sort(reverse=True)
+        matches = []
+        for score, run_id in scored[:limit]:
+            run = self.get_run(run_id)
+            if run is not None:
+                matches.append((score, run))
+        return matches
+
+    def index_similarity(self):
+        """One-time backfill of the similarity index for runs saved before it existed"""
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'similarity_indexed'").fetchone():
+                return 0
+        indexed = 0
+        with self._connect() as conn:
+            for run in self.iter_runs():
+                self._index_signature(conn, run['id'], run['profile'])
+                indexed += 1
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('similarity_indexed', ?)",
+                         (datetime.now().isoformat(),))
+        return indexed
+
+    def get_run(self, run_id):
+        row = self._connect().execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return self._row_to_run(row) if row else None
+
+    def find_runs(self, profile_hash=None, target_role=None, model=None, since=None, until=None,
+                  name=None, min_scores=None, limit=100, id_prefix=None):
+        """Most recent runs matching every given filter; dates are ISO strings.
+
+        `min_scores` maps score columns (output_schema.SCORE_COLUMNS) to
+        their lowest accepted value, e.g. {'quality_score': 80}.
+        """
+        clauses, params = [], []
+        for column, value in (min_scores or {}).items():
+            if column not in SCORE_COLUMNS:
+                raise ValueError(f"Unknown score column: {column}")
+            clauses.append(f"{column} >= ?")
+            params.append(value)
+        for column, value in (('profile_hash', profile_hash), ('target_role', target_role),
+                              ('model', model), ('name', name)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if id_prefix:
+            clauses.append("substr(id, 1, ?) = ?")
+            params.extend((len(id_prefix), id_prefix))
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        rows = self._connect().execute(
+            f"SELECT * FROM runs {where} ORDER BY created_at DESC LIMIT ?", params).fetchall()
+        return [self._row_to_run(row) for row in rows]
+
+    def score_summary(self, target_role=None, since=None):
+        """Number of scored runs and the average of each score, optionally for one role or period"""
+        clauses, params = [], []
+        if target_role is not None:
+            clauses.append("target_role = ?")
+            params.append(target_role)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        averages = ", ".join(f"AVG({column}) AS {column}" for column in SCORE_COLUMNS)
+        row = self._connect().execute(
+            f"SELECT COUNT(COALESCE({', '.join(SCORE_COLUMNS)})) AS scored, {averages} FROM runs {where}",
+            params).fetchone()
+        return {'scored': row['scored'],
+                **{column: round(row[column], 1) if row[column] is not None else None for column in SCORE_COLUMNS}}
+
+    def iter_runs(self, batch_size=500):
+        """Yield every run oldest-first without loading the table into memory"""
+        last = ('', '')
+        while True:
+            rows = self._connect().execute(
+                "SELECT * FROM runs WHERE (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?",
+                (*last, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_run(row)
+            last = (rows[-1]['created_at'], rows[-1]['id'])
+
+    def count_runs(self):
+        return self._connect().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def export_jsonl(self, path):
+        """Write every run as one JSON object per line; returns the number written"""
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for run in self.iter_runs():
+                f.write(json.dumps(run, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def save_document(self, name, data):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO documents (name, data, updated_at) VALUES (?, ?, ?)",
+                         (name, json.dumps(data, ensure_ascii=False), datetime.now().isoformat()))
+
+    def load_document(self, name):
+        row = self._connect().execute("SELECT data FROM documents WHERE name = ?", (name,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def save_agent_result(self, fingerprint, agent, model, result):
+        """Remember one agent's output under the fingerprint of its inputs"""
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO agent_results (fingerprint, agent, model, result, created_at) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (fingerprint, agent, model, result, datetime.now().isoformat()))
+
+    def get_agent_result(self, fingerprint):
+        row = self._connect().execute("SELECT result FROM agent_results WHERE fingerprint = ?",
+                                      (fingerprint,)).fetchone()
+        return row['result'] if row else None
+
+    def begin_checkpoint(self, run_id, profile, model, keep=True):
+        """Register the inputs of a checkpointed run.
+
+        Earlier checkpoints under `run_id` are kept only when `keep` is set
+        and they were made for the same profile and model.
+        """
+        digest = profile_hash(profile)
+        with self._connect() as conn:
+            row = conn.execute("SELECT profile_hash, model FROM checkpoint_runs WHERE run_id = ?",
+                               (run_id,)).fetchone()
+            if row and not (keep and row['profile_hash'] == digest and row['model'] == model):
+                conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            conn.execute("INSERT OR REPLACE INTO checkpoint_runs (run_id, profile_hash, profile, model, error, "
+                         "updated_at) VALUES (?, ?, ?, ?, NULL, ?)",
+                         (run_id, digest, json.dumps(profile, ensure_ascii=False), model,
+                          datetime.now().isoformat()))
+
+    def save_checkpoint(self, run_id, agent, result):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO checkpoints (run_id, agent, result, created_at) "
+                         "VALUES (?, ?, ?, ?)", (run_id, agent, result, datetime.now().isoformat()))
+
+    def load_checkpoints(self, run_id):
+        """{agent key: result} of the agents that completed under `run_id`"""
+        rows = self._connect().execute("SELECT agent, result FROM checkpoints WHERE run_id = ?",
+                                       (run_id,)).fetchall()
+        return {row['agent']: row['result'] for row in rows}
+
+    def fail_checkpoint(self, run_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE checkpoint_runs SET error = ?, updated_at = ? WHERE run_id = ?",
+                         (error, datetime.now().isoformat(), run_id))
+
+    def clear_checkpoints(self, run_id):
+        """Drop a run's checkpoints once it has completed"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM checkpoint_runs WHERE run_id = ?", (run_id,))
+
+    def get_checkpoint_run(self, run_id):
+        """Inputs, last error and completed agents of an unfinished run, or None"""
+        row = self._connect().execute("SELECT * FROM checkpoint_runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'run_id': row['run_id'],
+            'profile': json.loads(row['profile']),
+            'model': row['model'],
+            'error': row['error'],
+            'updated_at': row['updated_at'],
+            'completed': sorted(self.load_checkpoints(run_id)),
+        }
+
+    def import_legacy_files(self, data_dir=DATA_DIR):
+        """One-time import of results_*.json files written before the store existed.
+
+        The done flag is only written once every file was processed; each
+        file maps to a fixed run id, so an interrupted import can simply run again.
+        """
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+                return 0
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(data_dir, "results_*.json"))):
+            name = os.path.basename(path)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.save_run(data.get('profile', {}), data.get('results', {}), name=name,
+                              created_at=data.get('timestamp'), run_id=f"legacy_{name}")
+                imported += 1
+            except (OSError, ValueError, AttributeError):
+                continue
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                         (datetime.now().isoformat(),))
+        return imported
+
+    @staticmethod
+    def _row_to_run(row):
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'timestamp': row['created_at'],
+            'profile_hash': row['profile_hash'],
+            'target_role': row['target_role'],
+            'model': row['model'],
+            'profile': json.loads(row['profile']),
+            'results': json.loads(row['results']),
+            'timings': json.loads(row['timings']) if row['timings'] else None,
+            'scores': {column: row[column] for column in SCORE_COLUMNS},
+        }
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Process-wide ResultsStore, created (and legacy files imported) on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore()
+            _store.import_legacy_files()
+            _store.index_similarity()
+        return _store
+
+def save_data(data, filename):
+    """Persist `data` under `filename`; analysis runs go to the indexed runs table"""
+    store = get_store()
+    if 'results' in data and 'profile' in data:
+        return store.save_run(data['profile'], data['results'], model=data.get('model'),
+                              timings=data.get('timings'), name=filename,
+                              created_at=data.get('timestamp'))
+    store.save_document(filename, data)
+    return filename
+
+def load_data(filename):
+    store = get_store()
+    data = store.load_document(filename)
+    if data is not None:
+        return data
+    runs = store.find_runs(name=filename, limit=1)
+    if runs:
+        return runs[0]
+    # Files saved before the store existed
+    path = os.path.join(DATA_DIR, filename)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None